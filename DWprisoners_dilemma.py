@@ -19,887 +19,2786 @@ Draft, Do Not Distribute
 Version 7/23/15
 '''
 
+import binascii
+import collections
+import hashlib
+import json
+import numbers
 import random
-def play_round(player1, player2, history1, history2, score1, score2):
-    '''
-    Calls the get_action() function which will get the characters
-    'c' or 'b' for collude or betray for each player.
-    The history is provided in a string, e.g. 'ccb' indicates the player
-    colluded in the first two rounds and betrayed in the most recent round.
-    Returns a 4-tuple with updated histories and scores
-    (history1, history2, score1, score2)
-    '''
-    
-    RELEASE = 0 # (R) when both players collude
-    TREAT = 100 # (T) when you betray your partner
-    SEVERE_PUNISHMENT = -500 # (S) when your partner betrays you
-    PUNISHMENT = -250 # (P) when both players betray each other
-    # Keep T > R > P > S to be a Prisoner's Dilemma
-    # Keep 2R > T + S to be an Iterative Prisoner's Dilemma
-    
-    #Get the two players' actions and remember them.
-    action1 = get_action(player1, history1, history2, score1, score2)
-    action2 = get_action(player2, history2, history1, score2, score1)
-    if type(action1) != str:
-        action1=' '
-    if type(action2) != str:
-        action2=' '
-    #Append the actions to the previous histories, to return
-    new_history1 = history1 + action1
-    new_history2 = history2 + action2
-    
-    #Change scores based upon player actions
-    if action1 not in ('c','b') or action2 not in ('c','b'):
-        # Major punishment if player 1 does not return a 'c' or 'b'
-        if action1 not in ('c', 'b'):
-            new_score1 = score1 - 1000
-            # Same goes for player 2
-            if action2 not in ('c', 'b'):
-                new_score2 = score2 - 1000
-            else:
-                new_score2 = score2
-        else:
-            new_score2 = new_score2 - 1000
-            new_score1 = score1
-        
-    else: 
-    #Both players' code provided proper actions
-        if action1 == 'c':
-            if action2 == 'c':
-                # both players collude; get reward
-                new_score1 = score1 + RELEASE
-                new_score2 = score2 + RELEASE
-            else:
-                # players 1,2 collude, betray; get sucker, tempation
-                new_score1 = score1 + SEVERE_PUNISHMENT
-                new_score2 = score2 + TREAT
-        else:
-            if action2 == 'c':
-                # players 1,2 betray, collude; get tempation, sucker
-                new_score1 = score1 + TREAT
-                new_score2 = score2 + SEVERE_PUNISHMENT                       
-            else:
-                # both players betray; get punishment   
-                new_score1 = score1 + PUNISHMENT
-                new_score2 = score2 + PUNISHMENT
-                    
-    #send back the updated histories and scores
-    return (new_history1, new_history2, new_score1, new_score2)
-   
-def play_iterative_rounds(player1, player2):
+import struct
+import threading
+import time
+
+# The fewest and most rounds a match can last
+ROUNDS = (100, 200)
+
+def match_rng(seed, player1, player2, repetition=0):
     '''
-    Plays a random number of rounds (between 100 and 200 rounds) 
-    of the iterative prisoners' dilemma between two strategies.
-    identified in the parameters as integers.
-    Returns 4-tuple, for example ('cc', 'bb', -200, 600) 
-    but with much longer strings 
+    Returns a random.Random for one match, derived from the tournament seed,
+    the two players and the repetition number. Every match gets its own
+    independent stream, so any single match can be re-run in isolation:
+    play_iterative_rounds(player1, player2, match_rng(seed, player1, player2))
     '''
-    number_of_rounds = random.randint(100,200)
-    moves1 = ''
-    moves2 = ''
-    score1 = 0
-    score2 = 0
-    for round in range(number_of_rounds):
-        moves1, moves2, score1, score2 = \
-            play_round(player1, player2, moves1, moves2, score1, score2)
-    return (moves1, moves2, score1, score2)
+    key = '%d:%d:%d:%d' % (seed, player1, player2, repetition)
+    digest = hashlib.sha256(key.encode('ascii')).hexdigest()
+    return random.Random(int(digest[:16], 16))
 
-def get_action(player, history, opponent_history, score, opponent_score, getting_team_name=False):
-    '''Gets the strategy for the player, given their own history and that of
-    their opponent, as well as the current scores within this pairing.
-    The parameters history and opponenet history are strings with one letter
-    per round that has been played so far: either an 'c' for collude or a 'b' for 
-    betray. The function should return one character, 'c' or 'b'. 
-    The history strings have the first round between these two players 
-    as the first character and the most recent round as the last character.'''
-      
-    ######
-    ######
-    #
-<<<<<<< HEAD
-    # This example player always colludes
-    if player == 0:
-        if getting_team_name:
-            return 'loyal'
-        else:
-            return 'c'
+if bytes is str: # Python 2: a bytearray converts straight to a str
+    _as_str = str
+else:
+    def _as_str(moves):
+        return moves.decode('ascii')
 
-    
-=======
-    # This nonexample player nearly always colludes... right?
-    if player == 0:
-        global KNTHScoreLIST
-        if not 'KNTHMoveLIST' in globals():
-            global KNTHMoveLIST
-            KNTHMoveLIST = ''
-            KNTHScoreLIST = [0]
-            KNTHBScores = [0]
-            KNTHCScores = [0]
-        if getting_team_name:
-            return 'KNTH!!'
-               
-        else:
-            if len(history) == 0: #if it's the first round, collude since I'm hoepful
-                KNTHMoveLIST += 'c'
-                return 'c'
-            else:
-              KNTHScoreLIST += [score-sum(KNTHScoreLIST)]
-              KNTHBScores = [KNTHScoreLIST[i] if KNTHMoveLIST[i] == 'b' else 0 for i in range(len(history))]
-              KNTHCScores = [KNTHScoreLIST[i] for i in range(len(history)) if KNTHMoveLIST[i] == 'c']
-              KNTHBAverage = sum(KNTHBScores)/len(KNTHBScores)
-              KNTHCAverage = sum(KNTHCScores)/len(KNTHCScores)
-              if len(history) ==  1:# if it's the second round, betray... I've got a bad feeling about this...
-                KNTHMoveLIST += 'b'
-                return 'b'
-              elif KNTHCAverage > KNTHBAverage:
-                KNTHMoveLIST += 'c'
-                return 'c'
-              elif opponent_score < -300: #otherwise if the opponent is doing pretty badly collude, we should work together
-                  KNTHMoveLIST += 'c'
-                  return 'c'
-              elif opponent_score < score:#same reasoning
-                  #print('My opponent is losin\'!!')
-                  KNTHMoveLIST += 'c'
-                  return 'c'
-              else: #if nothing else is true, then betray, at least the other person will feel worse
-                  #print('My opponent is winning!!')
-                  KNTHMoveLIST += 'b'
-                  return 'b'
-
-
->>>>>>> origin/master
-        
-            
-                
-                    
-                            
-    ######
-    ######
-    #
-    #This example player always betrays.      
-    elif player == 1:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'backstabber'
-        else:
-            return 'b'
-=======
-            return 'Marco and Max'
+class History(object):
+    '''
+    The moves one player has made so far in a match, one byte per round.
+    Adding a move with append() takes the same time however long the
+    match is, where adding to a string copies the whole string each round.
+    A History can be used just like the history strings strategies have
+    always been given: len(history), history[-1], history[-3:],
+    history.count('b'), 'b' in history and history == 'ccb' all work,
+    and str(history) gives the moves as a string.
+    '''
+    def __init__(self, moves=''):
+        if isinstance(moves, History):
+            self._moves = bytearray(moves._moves)
         else:
-	   if len(history) > 2:
-		if opponent_history[-1] == 'c' and opponent_history[-2] == 'c' and opponent_history[-3] == 'c':
-		  return 'c'
-		else:
-		  return 'b'
-	   else:
-	       return 'b'
->>>>>>> origin/master
+            self._moves = bytearray(moves.encode('ascii'))
 
+    def append(self, move):
+        self._moves.append(ord(move))
 
+    def extend(self, moves):
+        self._moves.extend(moves.encode('ascii'))
 
+    def __len__(self):
+        return len(self._moves)
 
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return _as_str(self._moves[index])
+        return chr(self._moves[index])
 
+    def __iter__(self):
+        for move in self._moves:
+            yield chr(move)
 
+    def __contains__(self, moves):
+        return moves.encode('ascii') in self._moves
 
+    def count(self, moves):
+        return self._moves.count(moves.encode('ascii'))
 
-    ######
-    ######
-<<<<<<< HEAD
-    #   
-=======
->>>>>>> origin/master
-    #This example player is silent at first and then 
-    #only betrays if they were a sucker last round.
-    elif player == 2:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'loyal vengeful'
-=======
-            return 'Ping and Caden'
->>>>>>> origin/master
-        else:
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray if they were severely punished last time
-            else:
-<<<<<<< HEAD
-                return 'c' #otherwise collude
+    def __eq__(self, other):
+        if isinstance(other, History):
+            return self._moves == other._moves
+        return str(self) == other
 
+    def __ne__(self, other):
+        return not self == other
 
-    
-    
-    
-    
-    # EACH STUDENT TEAM CAN CHANGE ONE OF THESE elif SEGMENTS OF CODE.
+    __hash__ = None
 
+    def __add__(self, other):
+        return str(self) + str(other)
 
+    def __radd__(self, other):
+        return str(other) + str(self)
 
+    def __str__(self):
+        return _as_str(self._moves)
 
+    def __repr__(self):
+        return 'History(%r)' % str(self)
 
+# number of recent rounds kept in MatchStats.recent
+STATS_WINDOW = 10
 
-=======
-             	return 'c' #otherwise collude
->>>>>>> origin/master
-
-
-
+class MatchStats(object):
+    '''
+    Running totals for one player in one match, seen from that player's
+    side. The engine calls update() once per round, which takes the same
+    time however long the match is, so strategies can use these instead of
+    going back through the whole history every round.
+    rounds: number of rounds played so far
+    cooperations, betrayals: how often this player colluded / betrayed
+    opponent_cooperations, opponent_betrayals: the same for the opponent
+    payoffs: total points this player earned in the rounds where they
+        played each action, e.g. payoffs['b']
+    pair_counts: number of rounds with each (move, opponent_move) pair,
+        e.g. pair_counts[('c', 'b')]
+    recent: the last STATS_WINDOW (move, opponent_move) pairs, newest last
+    last_payoff: points this player earned in the most recent round
+    '''
+    def __init__(self, window=STATS_WINDOW):
+        self.rounds = 0
+        self.cooperations = 0
+        self.betrayals = 0
+        self.opponent_cooperations = 0
+        self.opponent_betrayals = 0
+        self.payoffs = {'c': 0, 'b': 0, ' ': 0}
+        self.pair_counts = {}
+        for move in 'cb ':
+            for opponent_move in 'cb ':
+                self.pair_counts[(move, opponent_move)] = 0
+        self.recent = collections.deque(maxlen=window)
+        self.last_payoff = 0
+
+    def update(self, move, opponent_move, payoff):
+        '''Records one round in which this player earned payoff.'''
+        self.rounds += 1
+        if move == 'c':
+            self.cooperations += 1
+        elif move == 'b':
+            self.betrayals += 1
+        if opponent_move == 'c':
+            self.opponent_cooperations += 1
+        elif opponent_move == 'b':
+            self.opponent_betrayals += 1
+        self.payoffs[move] += payoff
+        self.pair_counts[(move, opponent_move)] += 1
+        self.recent.append((move, opponent_move))
+        self.last_payoff = payoff
+
+    @classmethod
+    def from_histories(cls, history, opponent_history, payoff=None):
+        '''Builds the totals for a match already played up to now.'''
+        stats = cls()
+        for move, opponent_move in zip(history, opponent_history):
+            stats.update(move, opponent_move,
+                         score_round(move, opponent_move, payoff)[0])
+        return stats
+
+class MatchState(object):
+    '''
+    An empty object a strategy can set attributes on to remember things
+    from one round of a match to the next, e.g. context.state.last_payoff.
+    '''
 
-    ######
-    ######
-    #
-    elif player == 3:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'backstabber'
-        else:
-            # use history, opponent_history, score, opponent_score
-            # to compute your strategy
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'c' #otherwise collude
-=======
-            return 'Ping and Caden'
-        else:
-            if len(opponent_history)<5: # Collude for first 5 rounds
-                return 'c'
+class MatchContext(object):
+    '''
+    What a strategy is told about the match it is playing, besides the
+    histories and scores. Each player in a match has their own context,
+    made when the match starts and thrown away when it ends.
+    rng: the match's random number generator; strategies that make random
+        choices must use it instead of the random module
+    stats: a MatchStats kept up to date from this player's side
+    state: a MatchState for anything else the strategy wants to remember
+        during the match. Strategies must keep that here, not in module
+        globals, so that matches can be played at the same time.
+    '''
+    def __init__(self, rng=None, stats=None):
+        if rng is None:
+            rng = random
+        if stats is None:
+            stats = MatchStats()
+        self.rng = rng
+        self.stats = stats
+        self.state = MatchState()
+
+# The moves a History can hold, in the order of their codes in move_codes()
+MOVES = 'cb '
+
+class PayoffMatrix(object):
+    '''
+    The points each player earns for one round:
+    release (R) when both players collude
+    treat (T) when you betray your partner
+    severe_punishment (S) when your partner betrays you
+    punishment (P) when both players betray each other
+    invalid when you do not return a 'c' or 'b'
+    The values are checked once, when the matrix is made: they must be
+    numbers, integers or floats, and keep T > R > P > S to be a Prisoner's
+    Dilemma and 2R > T + S to be an Iterative Prisoner's Dilemma. Floats
+    give float scores everywhere, except in a BinaryReport, which only
+    takes integers.
+    points[(action1, action2)] is the 2-tuple score_round() returns.
+    '''
+    def __init__(self, release=0, treat=100, severe_punishment=-500,
+                 punishment=-250, invalid=-1000):
+        for name, value in (('release', release), ('treat', treat),
+                            ('severe_punishment', severe_punishment),
+                            ('punishment', punishment),
+                            ('invalid', invalid)):
+            if isinstance(value, bool) or \
+                    not isinstance(value, numbers.Real):
+                raise TypeError('%s must be an integer or a float, got %r' %
+                                (name, value))
+        if not treat > release > punishment > severe_punishment:
+            raise ValueError('need T > R > P > S, got T=%r R=%r P=%r S=%r' %
+                             (treat, release, punishment, severe_punishment))
+        if not 2*release > treat + severe_punishment:
+            raise ValueError('need 2R > T + S, got R=%r T=%r S=%r' %
+                             (release, treat, severe_punishment))
+        self.release = release
+        self.treat = treat
+        self.severe_punishment = severe_punishment
+        self.punishment = punishment
+        self.invalid = invalid
+        self.points = {}
+        for action1 in MOVES:
+            for action2 in MOVES:
+                self.points[(action1, action2)] = \
+                    self._score(action1, action2)
+
+    def _score(self, action1, action2):
+        if action1 not in ('c','b') or action2 not in ('c','b'):
+            # Major punishment for a player who does not return a 'c' or 'b'
+            points1 = 0
+            points2 = 0
+            if action1 not in ('c', 'b'):
+                points1 = self.invalid
+            # Same goes for player 2
+            if action2 not in ('c', 'b'):
+                points2 = self.invalid
+            
+        else: 
+        #Both players' code provided proper actions
+            if action1 == 'c':
+                if action2 == 'c':
+                    # both players collude; get reward
+                    points1 = self.release
+                    points2 = self.release
+                else:
+                    # players 1,2 collude, betray; get sucker, tempation
+                    points1 = self.severe_punishment
+                    points2 = self.treat
             else:
-                return opponent_history[-1] # Do whatever opponet did last round
->>>>>>> origin/master
-
-
-
-
-
-
-
-
-
-
-
-    ######
-    ######
-    #
-    elif player == 4:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'loyal vengeful with permanent second impression'
+                if action2 == 'c':
+                    # players 1,2 betray, collude; get tempation, sucker
+                    points1 = self.treat
+                    points2 = self.severe_punishment
+                else:
+                    # both players betray; get punishment   
+                    points1 = self.punishment
+                    points2 = self.punishment
+        return (points1, points2)
+
+    def round_bounds(self, moves1=MOVES, moves2=MOVES):
+        '''
+        Returns 2-tuple (lowest, highest): the fewest and the most points
+        player 1 can earn in one round in which player 1 plays one of
+        moves1 and player 2 one of moves2. By default any move, invalid
+        ones included.
+        '''
+        points = [self.points[(action1, action2)][0]
+                  for action1 in moves1 for action2 in moves2]
+        return (min(points), max(points))
+
+    def values(self):
+        '''Returns (R, T, S, P, invalid).'''
+        return (self.release, self.treat, self.severe_punishment,
+                self.punishment, self.invalid)
+
+    def __eq__(self, other):
+        return isinstance(other, PayoffMatrix) and \
+            self.values() == other.values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.values())
+
+    def __repr__(self):
+        return ('PayoffMatrix(release=%r, treat=%r, severe_punishment=%r, '
+                'punishment=%r, invalid=%r)' % self.values())
+
+# The payoffs the tournament has always used
+DEFAULT_PAYOFF = PayoffMatrix()
+
+def score_round(action1, action2, payoff=None):
+    '''
+    Returns a 2-tuple (points1, points2): the points each player earns
+    for one round in which they played action1 and action2, from payoff,
+    a PayoffMatrix (DEFAULT_PAYOFF if not given).
+    '''
+    if payoff is None:
+        payoff = DEFAULT_PAYOFF
+    if action1 not in ('c', 'b'):
+        action1 = ' '
+    if action2 not in ('c', 'b'):
+        action2 = ' '
+    return payoff.points[(action1, action2)]
+
+# the best clock there is for timing short calls
+timer = getattr(time, 'perf_counter', time.time)
+
+class Profile(object):
+    '''
+    Times each strategy's calls while a tournament is played.
+    timings[player] is a list [seconds, calls, slowest, history_length]:
+    the total time spent in player's strategy, the number of calls, the
+    time the slowest call took and the length of the history it was given.
+    Profiling is on while the module's PROFILE is a Profile; see
+    start_profile().
+    '''
+    def __init__(self):
+        self.timings = {}
+        # matches played on threads, under a Budget, share the timings
+        self.lock = threading.Lock()
+
+    def wrap(self, player, function):
+        '''Returns function timed as player's strategy.'''
+        with self.lock:
+            timing = self.timings.setdefault(player, [0.0, 0, 0.0, 0])
+        def timed(history, opponent_history, score, opponent_score, context):
+            start = timer()
+            action = function(history, opponent_history, score,
+                              opponent_score, context)
+            elapsed = timer() - start
+            with self.lock:
+                timing[0] += elapsed
+                timing[1] += 1
+                if elapsed > timing[2]:
+                    timing[2] = elapsed
+                    timing[3] = len(history)
+            return action
+        return timed
+
+    def merge(self, timings):
+        '''Adds timings from another Profile, e.g. from a worker process.'''
+        for player, (seconds, calls, slowest, history_length) in \
+                timings.items():
+            timing = self.timings.setdefault(player, [0.0, 0, 0.0, 0])
+            timing[0] += seconds
+            timing[1] += calls
+            if slowest > timing[2]:
+                timing[2] = slowest
+                timing[3] = history_length
+
+    def rows(self):
+        '''
+        Returns a list of dicts, one per player, slowest total first, with
+        keys player, team_name, seconds, calls, slowest and history_length.
+        '''
+        rows = []
+        for player, (seconds, calls, slowest, history_length) in \
+                self.timings.items():
+            strategy = STRATEGIES.get(player)
+            rows.append({'player': player,
+                         'team_name': strategy.team_name if strategy else None,
+                         'seconds': seconds,
+                         'calls': calls,
+                         'slowest': slowest,
+                         'history_length': history_length})
+        rows.sort(key=lambda row: -row['seconds'])
+        return rows
+
+    def print_table(self):
+        print('\n\n Time spent in each strategy:\n')
+        print('player\tseconds\tcalls\tus/call\tslowest us\t'
+              'at round\tteam')
+        for row in self.rows():
+            print('%s\t%.4f\t%d\t%.2f\t%.2f\t%d\t%s' % (
+                row['player'], row['seconds'], row['calls'],
+                row['seconds']*1e6/max(row['calls'], 1), row['slowest']*1e6,
+                row['history_length'] + 1, row['team_name']))
+
+    def write_json(self, filename):
+        with open(filename, 'w') as output:
+            json.dump(self.rows(), output, indent=1)
+
+# the Profile the strategies are being timed in, or None when not profiling
+PROFILE = None
+
+def start_profile():
+    '''Starts timing every strategy call, and returns the Profile.'''
+    global PROFILE
+    PROFILE = Profile()
+    return PROFILE
+
+def stop_profile():
+    '''Stops timing strategy calls, and returns the Profile.'''
+    global PROFILE
+    profile = PROFILE
+    PROFILE = None
+    return profile
+
+# how much longer than its limit a strategy call may take to come back from
+# its worker before the worker is killed: passing the call there and back
+# takes time too
+BUDGET_GRACE = 0.05
+
+class RemoteRandom(object):
+    '''
+    The match's random number generator as a strategy in a Budget's worker
+    process sees it: the first time the strategy uses it in a call, its
+    state is fetched from the process playing the match, and after the
+    call the new state goes back, so the draws are the same as without a
+    budget. _waited is the time spent fetching, which is not the
+    strategy's. Its own attributes start with _, so they cannot hide the
+    generator's.
+    '''
+    def __init__(self, connection):
+        self._connection = connection
+        self._random = random.Random()
+        self._fetched = False
+        self._waited = 0.0
+
+    def __getattr__(self, name):
+        if not self._fetched:
+            begin = timer()
+            self._connection.send(('rng',))
+            self._random.setstate(self._connection.recv())
+            self._fetched = True
+            self._waited = timer() - begin
+        return getattr(self._random, name)
+
+def serve_strategy(function, connection):
+    '''
+    Runs in a Budget's worker process: answers each request from the
+    connection with function's move, until it gets None.
+    A request is (start, last, score, opponent_score). For the first call
+    of a match, start is (history, opponent_history, stats): the histories
+    as strings and the player's MatchStats, and a new MatchContext is
+    made; otherwise start is None and last is (move, opponent_move,
+    points), the round played since the last call. While the strategy
+    runs, the worker may ask ('rng',) for the state of the match's random
+    number generator (see RemoteRandom). The answer is ('move', move,
+    seconds, rng_state): the move ('c', 'b', ' ', or None if the strategy
+    raised an exception), how long the call took, and the generator's new
+    state, or None if the strategy did not use it.
+    '''
+    rng = RemoteRandom(connection)
+    while True:
+        request = connection.recv()
+        if request is None:
+            break
+        start, last, score, opponent_score = request
+        if start is not None:
+            history, opponent_history, stats = start
+            history = History(history)
+            opponent_history = History(opponent_history)
+            context = MatchContext(rng, stats)
         else:
-            # use history, opponent_history, score, opponent_score
-            # to compute your strategy
-            size = len(history)
-            if(size%3==0): #the number of rounds played is a multiple of 3
-                return 'c'
+            move, opponent_move, points = last
+            history.append(move)
+            opponent_history.append(opponent_move)
+            context.stats.update(move, opponent_move, points)
+        rng._fetched = False
+        rng._waited = 0.0
+        begin = timer()
+        try:
+            move = function(history, opponent_history, score,
+                            opponent_score, context)
+            if type(move) != str or move not in ('c', 'b'):
+                move = ' '
+        except Exception:
+            move = None
+        seconds = timer() - begin - rng._waited
+        rng_state = None
+        if rng._fetched:
+            rng_state = rng._random.getstate()
+        connection.send(('move', move, seconds, rng_state))
+
+class StrategyWorker(object):
+    '''
+    A process that plays one strategy function for a Budget, so a call
+    that runs too long can be stopped by killing the process.
+    '''
+    def __init__(self, function):
+        import multiprocessing
+        # fork, so the function need not be pickled
+        if hasattr(multiprocessing, 'get_context'):
+            multiprocessing = multiprocessing.get_context('fork')
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target=serve_strategy,
+                                               args=(function, child))
+        self.process.daemon = True
+        self.process.start()
+        child.close()
+
+    def close(self):
+        try:
+            self.connection.send(None)
+        except (IOError, OSError):
+            pass
+        self.connection.close()
+        self.process.join(BUDGET_GRACE)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            # a strategy can ignore SIGTERM, but not SIGKILL
+            getattr(self.process, 'kill', self.process.terminate)()
+        self.process.join()
+
+class Budget(object):
+    '''
+    Limits the wall-clock time each strategy call may take. Each strategy
+    is played in a worker process of its own (a StrategyWorker, one per
+    strategy and thread), which is sent the histories and asked for each
+    move. A call that takes more than call_seconds counts as an invalid
+    move; if it has not answered BUDGET_GRACE seconds after that, its
+    worker is killed and a new one started, which starts the match's
+    context.state afresh. Once a strategy has used match_seconds in one
+    match, its moves for the rest of that match are invalid without it
+    being called. Either limit may be None. A strategy that raises an
+    exception, or whose worker dies, makes an invalid move too, and the
+    tournament carries on.
+    Strategies that make random choices still get the match's random
+    number generator, passed to the worker and back with every call, so a
+    strategy that keeps within its budget plays just as it does without
+    one. The workers are forked, so this needs Unix.
+    overruns[player] is a list [calls, matches, errors]: the number of
+    player's calls that took too long, the number of matches in which
+    player ran out of time, and the number of calls that raised an
+    exception or lost the worker.
+    Budgets are on while the module's BUDGET is a Budget; see
+    start_budget(). close() stops the workers.
+    '''
+    def __init__(self, call_seconds=None, match_seconds=None):
+        self.call_seconds = call_seconds
+        self.match_seconds = match_seconds
+        self.overruns = {}
+        self.lock = threading.Lock()
+        # each thread's workers, by player
+        self.local = threading.local()
+        self.all_workers = []
+
+    def worker(self, player, function):
+        '''Returns this thread's StrategyWorker for player.'''
+        workers = getattr(self.local, 'workers', None)
+        if workers is None:
+            workers = self.local.workers = {}
+        if player not in workers:
+            workers[player] = StrategyWorker(function)
+            with self.lock:
+                self.all_workers.append(workers[player])
+        return workers[player]
+
+    def drop_worker(self, player):
+        '''Kills this thread's worker for player; the next call starts one.'''
+        worker = self.local.workers.pop(player)
+        worker.kill()
+        with self.lock:
+            self.all_workers.remove(worker)
+
+    def count(self, player, kind):
+        with self.lock:
+            self.overruns.setdefault(player, [0, 0, 0])[kind] += 1
+
+    def wrap(self, player, function):
+        '''Returns function limited to player's budget for one match.'''
+        # time used this match, whether it ran out, and whether the worker
+        # has been told about this match yet
+        used = [0.0, False, False]
+        def limited(history, opponent_history, score, opponent_score,
+                    context):
+            limit = self.call_seconds
+            if self.match_seconds is not None:
+                left = self.match_seconds - used[0]
+                if left <= 0:
+                    if not used[1]:
+                        used[1] = True
+                        self.count(player, 1)
+                    return ' '
+                if limit is None or left < limit:
+                    limit = left
+            worker = self.worker(player, function)
+            start = None
+            last = None
+            if not used[2]:
+                start = (str(history), str(opponent_history), context.stats)
             else:
-                return 'b'
-=======
-            return 'Marco and Max'
-        else:
-	   if len(history) > 2:
-		if opponent_history[-1] == 'c' and opponent_history[-2] == 'c' and opponent_history[-3] == 'c':
-		  return 'c'
-		else:
-		  return 'b'
-	   else:
-	       return 'b'
->>>>>>> origin/master
+                last = (history[-1], opponent_history[-1],
+                        context.stats.last_payoff)
+            deadline = None
+            if limit is not None:
+                deadline = timer() + limit + BUDGET_GRACE
+            try:
+                worker.connection.send((start, last, score, opponent_score))
+                used[2] = True
+                while True:
+                    wait = None
+                    if deadline is not None:
+                        wait = max(0.0, deadline - timer())
+                    if not worker.connection.poll(wait):
+                        # still going: stop it
+                        self.drop_worker(player)
+                        self.count(player, 0)
+                        used[0] += limit + BUDGET_GRACE
+                        used[2] = False
+                        return ' '
+                    answer = worker.connection.recv()
+                    if answer[0] != 'rng':
+                        break
+                    worker.connection.send(context.rng.getstate())
+            except (EOFError, IOError, OSError):
+                # the worker died, e.g. the strategy called os._exit()
+                self.drop_worker(player)
+                self.count(player, 2)
+                used[2] = False
+                return ' '
+            tag, move, seconds, rng_state = answer
+            used[0] += seconds
+            if rng_state is not None:
+                context.rng.setstate(rng_state)
+            if move is None:
+                self.count(player, 2)
+                return ' '
+            if limit is not None and seconds > limit:
+                self.count(player, 0)
+                return ' '
+            return move
+        return limited
+
+    def close(self):
+        '''Stops every worker.'''
+        with self.lock:
+            workers = self.all_workers
+            self.all_workers = []
+        for worker in workers:
+            worker.close()
+
+    def print_report(self):
+        offenders = sorted(player for player, overrun in self.overruns.items()
+                           if any(overrun))
+        if not offenders:
+            print('\n\n No strategy ran over its time budget.')
+            return
+        print('\n\n Strategies that ran over their time budget or failed:\n')
+        print('player\tcalls too slow\tmatches out of time\terrors\tteam')
+        for player in offenders:
+            strategy = STRATEGIES.get(player)
+            calls, matches, errors = self.overruns[player]
+            print('%s\t%d\t%d\t%d\t%s' % (player, calls, matches, errors,
+                                          strategy.team_name if strategy
+                                          else None))
+
+# the Budget strategy calls are limited by, or None for no limit
+BUDGET = None
+
+def start_budget(call_seconds=None, match_seconds=None):
+    '''Starts limiting strategy calls' time, and returns the Budget.'''
+    global BUDGET
+    BUDGET = Budget(call_seconds, match_seconds)
+    return BUDGET
+
+def stop_budget():
+    '''
+    Stops limiting strategy calls, stops the Budget's workers, and returns
+    the Budget.
+    '''
+    global BUDGET
+    budget = BUDGET
+    BUDGET = None
+    if budget is not None:
+        budget.close()
+    return budget
+
+def play_round(player1, player2, history1, history2, score1, score2,
+               context1=None, context2=None, payoff=None):
+    '''
+    Calls each player's strategy to get the characters
+    'c' or 'b' for collude or betray for each player.
+    player1 and player2 are player numbers, or the functions
+    resolve_strategy() returned for them.
+    The history is provided as a History, e.g. 'ccb' indicates the player
+    colluded in the first two rounds and betrayed in the most recent round.
+    Each player's action is appended to their History in place;
+    anything other than 'c' or 'b' is recorded as ' '.
+    context1 and context2 are the players' MatchContexts; their stats are
+    updated with this round. If they are not given they are built from
+    the histories.
+    payoff is the PayoffMatrix to score the round with.
+    Returns a 4-tuple with updated histories and scores
+    (history1, history2, score1, score2)
+    '''
     
+    if context1 is None:
+        context1 = MatchContext(
+            stats=MatchStats.from_histories(history1, history2, payoff))
+    if context2 is None:
+        context2 = MatchContext(
+            stats=MatchStats.from_histories(history2, history1, payoff))
     
+    #Get the two players' actions and remember them.
+    action1 = resolve_strategy(player1)(history1, history2, score1, score2,
+                                        context1)
+    action2 = resolve_strategy(player2)(history2, history1, score2, score1,
+                                        context2)
+    if type(action1) != str or action1 not in ('c', 'b'):
+        action1=' '
+    if type(action2) != str or action2 not in ('c', 'b'):
+        action2=' '
+    #Append the actions to the previous histories, to return
+    history1.append(action1)
+    history2.append(action2)
     
+    #Change scores based upon player actions
+    points1, points2 = score_round(action1, action2, payoff)
+    context1.stats.update(action1, action2, points1)
+    context2.stats.update(action2, action1, points2)
+                    
+    #send back the updated histories and scores
+    return (history1, history2, score1 + points1, score2 + points2)
+   
+def play_iterative_rounds(player1, player2, rng=None, payoff=None):
+    '''
+    Plays a random number of rounds (between 100 and 200 rounds) 
+    of the iterative prisoners' dilemma between two strategies.
+    identified in the parameters as integers.
+    rng supplies the number of rounds and the strategies' random choices;
+    it defaults to the random module.
+    payoff is the PayoffMatrix to score the rounds with.
+    Returns 4-tuple, for example (History('cc'), History('bb'), -200, 600) 
+    but with much longer histories 
+    '''
+    return play_match(player1, player2, rng, payoff)[:4]
 
+def play_match(player1, player2, rng=None, payoff=None):
+    '''
+    Plays a match just like play_iterative_rounds(), but may fast-forward:
+    if both strategies are memory-one the match is worked out by
+    play_memory_one() without calling them, and if both have a declared
+    memory the rest of the match is worked out as soon as the last rounds
+    repeat (see fast_forward()), with the moves looked up by
+    play_memory_tables() if both strategies were compiled to tables.
+    Returns 5-tuple (moves1, moves2, score1, score2, fast_forwarded):
+    fast_forwarded is the number of rounds actually played before the rest
+    of the match was worked out, or None if every round was played.
+    '''
+    if rng is None:
+        rng = random
+    number_of_rounds = rng.randint(ROUNDS[0], ROUNDS[1])
+    table1 = memory_one_table(player1)
+    table2 = memory_one_table(player2)
+    if table1 is not None and table2 is not None:
+        return play_memory_one(table1, table2, number_of_rounds, payoff)
+    table1 = memory_table(player1)
+    table2 = memory_table(player2)
+    if table1 is not None and table2 is not None:
+        return play_memory_tables(table1, table2, number_of_rounds, payoff)
+    moves1 = History()
+    moves2 = History()
+    score1 = 0
+    score2 = 0
+    context1 = MatchContext(rng)
+    context2 = MatchContext(rng)
+    # look up the strategies once for the whole match
+    strategy1 = resolve_strategy(player1)
+    strategy2 = resolve_strategy(player2)
+    if BUDGET is not None:
+        strategy1 = BUDGET.wrap(player1, strategy1)
+        strategy2 = BUDGET.wrap(player2, strategy2)
+    if PROFILE is not None:
+        strategy1 = PROFILE.wrap(player1, strategy1)
+        strategy2 = PROFILE.wrap(player2, strategy2)
+    # for a pair with bounded memory, the last window rounds decide the
+    # rest of the match
+    window = match_window(player1, player2)
+    if BUDGET is not None:
+        # a call that runs out of time makes the moves depend on timing
+        window = None
+    first_seen = {} # round after which each window of rounds was first seen
+    scores = [(0, 0)] # the scores after each round
+    for round in range(number_of_rounds):
+        moves1, moves2, score1, score2 = \
+            play_round(strategy1, strategy2, moves1, moves2, score1, score2,
+                       context1, context2, payoff)
+        if window is None:
+            continue
+        played = round + 1
+        scores.append((score1, score2))
+        if played < window:
+            continue
+        last_rounds = (moves1[-window:], moves2[-window:])
+        if last_rounds in first_seen:
+            return fast_forward(moves1, moves2, scores,
+                                first_seen[last_rounds], number_of_rounds)
+        first_seen[last_rounds] = played
+    return (moves1, moves2, score1, score2, None)
+
+def fast_forward(moves1, moves2, scores, cycle_start, number_of_rounds):
+    '''
+    Finishes a match between two deterministic strategies whose last
+    rounds have just repeated what they were after cycle_start rounds.
+    From then on the rounds since cycle_start repeat until the match ends,
+    so the remaining moves are copied and the remaining points added up
+    from the cycle instead of being played.
+    scores[r] is the 2-tuple of scores after r rounds.
+    Returns the same 5-tuple as play_match().
+    '''
+    played = len(moves1)
+    cycle_length = played - cycle_start
+    repeats, extra = divmod(number_of_rounds - played, cycle_length)
+    cycle1 = moves1[cycle_start:]
+    cycle2 = moves2[cycle_start:]
+    moves1.extend(cycle1*repeats + cycle1[:extra])
+    moves2.extend(cycle2*repeats + cycle2[:extra])
+    start1, start2 = scores[cycle_start]
+    end1, end2 = scores[played]
+    extra1, extra2 = scores[cycle_start + extra]
+    score1 = end1 + repeats*(end1 - start1) + (extra1 - start1)
+    score2 = end2 + repeats*(end2 - start2) + (extra2 - start2)
+    return (moves1, moves2, score1, score2, played)
+
+def score_history(moves1, moves2, payoff=None):
+    '''
+    Returns 2-tuple (score1, score2): the final scores of a recorded match
+    with moves1 and moves2, scored with payoff, a PayoffMatrix.
+    '''
+    if payoff is None:
+        payoff = DEFAULT_PAYOFF
+    points = payoff.points
+    score1 = 0
+    score2 = 0
+    for action1, action2 in zip(moves1, moves2):
+        points1, points2 = points[(action1, action2)]
+        score1 += points1
+        score2 += points2
+    return (score1, score2)
 
-
-
-
-
-
-
-    ######
-    ######        
-    #
-<<<<<<< HEAD
-    elif player == 5:
-        if getting_team_name:
-            return 'backstabber'
-        else:
-            # use history, opponent_history, score, opponent_score
-            # to compute your strategy
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'c' #otherwise collude
-    
-    
+def move_codes(moves):
+    '''
+    Returns moves as a NumPy array of move codes: 0 for 'c', 1 for 'b' and
+    2 for anything else, the same as play_round() treats as invalid.
+    moves is a History, a string, or an array that already holds codes.
+    '''
+    import numpy
+    if isinstance(moves, History):
+        raw = numpy.frombuffer(bytes(moves._moves), dtype=numpy.uint8)
+    elif isinstance(moves, str):
+        raw = numpy.frombuffer(moves.encode('ascii'), dtype=numpy.uint8)
+    else:
+        return numpy.asarray(moves, dtype=numpy.uint8)
+    lookup = numpy.full(256, 2, dtype=numpy.uint8)
+    lookup[ord('c')] = 0
+    lookup[ord('b')] = 1
+    return lookup[raw]
+
+# turns move codes back into moves, with bytes.translate()
+CODE_MOVES = bytearray(range(256))
+CODE_MOVES[0:3] = b'cb '
+CODE_MOVES = bytes(CODE_MOVES)
+
+def moves_from_codes(codes):
+    '''
+    Returns the string of moves for move codes, in a bytearray or a NumPy
+    array.
+    '''
+    if isinstance(codes, bytearray):
+        raw = bytes(codes)
+    else:
+        import numpy
+        raw = numpy.ascontiguousarray(codes, dtype=numpy.uint8).tobytes()
+    return _as_str(raw.translate(CODE_MOVES))
+
+def payoff_tables(payoff=None):
+    '''
+    Returns two 3x3 NumPy arrays (points1, points2): points1[i, j] is what
+    score_round() gives player 1 when the players' moves have codes i and j,
+    scored with payoff, a PayoffMatrix.
+    They are filled in from score_round() itself, so scoring with them
+    always agrees with playing the rounds: the arrays hold integers if every
+    payoff is an integer, and floats otherwise.
+    '''
+    import numpy
+    points = [[score_round(action1, action2, payoff) for action2 in MOVES]
+              for action1 in MOVES]
+    dtype = numpy.int64
+    if not all(isinstance(value, numbers.Integral)
+               for row in points for pair in row for value in pair):
+        dtype = numpy.float64
+    points1 = numpy.array([[pair[0] for pair in row] for row in points],
+                          dtype=dtype)
+    points2 = numpy.array([[pair[1] for pair in row] for row in points],
+                          dtype=dtype)
+    return (points1, points2)
+
+def score_moves(moves1, moves2, payoff=None):
+    '''
+    Scores a whole recorded match at once with NumPy instead of round by
+    round. moves1 and moves2 are anything move_codes() accepts; payoff is
+    the PayoffMatrix to score them with.
+    Returns 4-tuple of NumPy arrays (points1, points2, score1, score2):
+    the points each player earned in each round, and their running score
+    after each round, so score1[-1] is player 1's final score.
+    '''
+    import numpy
+    codes1 = move_codes(moves1)
+    codes2 = move_codes(moves2)
+    if len(codes1) != len(codes2):
+        raise ValueError('the players played %d and %d rounds' %
+                         (len(codes1), len(codes2)))
+    table1, table2 = payoff_tables(payoff)
+    points1 = table1[codes1, codes2]
+    points2 = table2[codes1, codes2]
+    return (points1, points2, numpy.cumsum(points1), numpy.cumsum(points2))
+
+def score_moves_table(moves_table, payoff=None):
+    '''
+    Scores every match in a moves_table, as built by play_tournament(),
+    in one NumPy pass over all the recorded moves, with payoff, a
+    PayoffMatrix.
+    Returns 2-tuple of NumPy arrays (scores, rounds): scores[p1, p2] is
+    player p1's total score against p2 and rounds[p1, p2] the number of
+    rounds they played; the diagonal is 0.
+    '''
+    import numpy
+    num_players = len(moves_table)
+    table1, table2 = payoff_tables(payoff)
+    scores = numpy.zeros((num_players, num_players), dtype=table1.dtype)
+    rounds = numpy.zeros((num_players, num_players), dtype=numpy.int64)
+    pairs = [(player1, player2) for player1 in range(num_players)
+             for player2 in range(player1)]
+    if not pairs:
+        return (scores, rounds)
+    codes1 = [move_codes(moves_table[player1][player2])
+              for player1, player2 in pairs]
+    codes2 = [move_codes(moves_table[player2][player1])
+              for player1, player2 in pairs]
+    lengths = numpy.array([len(codes) for codes in codes1], dtype=numpy.int64)
+    # every match laid end to end, then summed back up match by match
+    all_codes1 = numpy.concatenate(codes1)
+    all_codes2 = numpy.concatenate(codes2)
+    if len(all_codes2) != len(all_codes1):
+        raise ValueError('the two sides of a match played different rounds')
+    starts = numpy.concatenate(([0], numpy.cumsum(lengths)[:-1]))
+    totals1 = numpy.add.reduceat(table1[all_codes1, all_codes2], starts)
+    totals2 = numpy.add.reduceat(table2[all_codes1, all_codes2], starts)
+    # reduceat gives the next match's first round for an empty match
+    totals1[lengths == 0] = 0
+    totals2[lengths == 0] = 0
+    first = numpy.array([player1 for player1, player2 in pairs])
+    second = numpy.array([player2 for player1, player2 in pairs])
+    scores[first, second] = totals1
+    scores[second, first] = totals2
+    rounds[first, second] = lengths
+    rounds[second, first] = lengths
+    return (scores, rounds)
+
+def play_memory_one(table1, table2, number_of_rounds, payoff=None):
+    '''
+    Plays a match between two memory-one strategies, given as their
+    MemoryOne tables, without calling any Python per round.
+    Each round's moves depend only on the round before, and there are only
+    four possible rounds, so within five rounds the match is back to a
+    round it has played before and repeats from there on. The moves and
+    scores for the rest of the match are worked out from that cycle.
+    Returns the same 5-tuple as play_match().
+    '''
+    move1 = table1.opening
+    move2 = table2.opening
+    moves1 = []
+    moves2 = []
+    first_played = {} # round number each (move1, move2) was first played
+    while len(moves1) < number_of_rounds and \
+            (move1, move2) not in first_played:
+        first_played[(move1, move2)] = len(moves1)
+        moves1.append(move1)
+        moves2.append(move2)
+        move1, move2 = (table1.responses[(move1, move2)],
+                        table2.responses[(move2, move1)])
+    # the rounds from start on repeat until the match ends
+    start = first_played.get((move1, move2), len(moves1))
+    prefix1 = ''.join(moves1[:start])
+    prefix2 = ''.join(moves2[:start])
+    cycle1 = ''.join(moves1[start:])
+    cycle2 = ''.join(moves2[start:])
+    repeats, extra = divmod(number_of_rounds - start, max(len(cycle1), 1))
     
-=======
-
-    elif player == 5:
-        if getting_team_name:
-            return 'Liam?'
-        else:
-            if len(opponent_history)==0:
-                return 'c'
-            else:
-                recent_round_opponent = opponent_history[-1]
-                recent_round_me = history[-1]
-                for round in range(len(history)-1):
-                    prior_round_opponent = opponent_history[round]
-                    prior_round_me = history[round]
-                    #if one matches
-                    if (prior_round_me == recent_round_me) and \
-                            (prior_round_opponent == recent_round_opponent):
-                        return opponent_history[round]
-                if history[-1]=='c' and opponent_history[-1]=='b':
-                    return 'b' # betray is they were severely punished last time
+    prefix_score1, prefix_score2 = score_history(prefix1, prefix2, payoff)
+    cycle_score1, cycle_score2 = score_history(cycle1, cycle2, payoff)
+    extra_score1, extra_score2 = \
+        score_history(cycle1[:extra], cycle2[:extra], payoff)
+    score1 = prefix_score1 + repeats*cycle_score1 + extra_score1
+    score2 = prefix_score2 + repeats*cycle_score2 + extra_score2
+    fast_forwarded = len(moves1)
+    if fast_forwarded == number_of_rounds:
+        fast_forwarded = None
+    return (History(prefix1 + cycle1*repeats + cycle1[:extra]),
+            History(prefix2 + cycle2*repeats + cycle2[:extra]),
+            score1, score2, fast_forwarded)
+
+class MemoryOne(object):
+    '''
+    The response table of a memory-one strategy, one that decides each move
+    only from the round before: opening is the first move, and cc, cb, bc
+    and bb are the moves after a round in which this player and the
+    opponent played c and c, c and b, b and c, or b and b.
+    responses[(move, opponent_move)] gives the same.
+    '''
+    # the longest histories check() tries: 4**CHECKED_ROUNDS of them
+    CHECKED_ROUNDS = 4
+
+    def __init__(self, opening, cc, cb, bc, bb):
+        self.opening = opening
+        self.responses = {('c', 'c'): cc, ('c', 'b'): cb,
+                          ('b', 'c'): bc, ('b', 'b'): bb}
+
+    def check(self, function):
+        '''
+        Raises ValueError unless function plays this table after every
+        history of up to CHECKED_ROUNDS rounds. A strategy that looks
+        further back than the round before shows up once it sees a
+        history longer than one round, as compile_memory() finds at
+        memory + 1 rounds; checking a few more rounds than that also
+        catches strategies that only react to a run of moves.
+        '''
+        for length in range(self.CHECKED_ROUNDS + 1):
+            for state in range(4**length):
+                history, opponent_history = histories_from_state(state,
+                                                                 length)
+                if length == 0:
+                    expected = self.opening
                 else:
-                    return 'c' #otherwise collude 
-  
->>>>>>> origin/master
-    
-
-
-
-
-
-    ######
-    ######        
-    #
-    elif player == 6:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'backstabber'
-=======
-            return 'Dat1AZNBanana'
->>>>>>> origin/master
-        else:
-            # use history, opponent_history, score, opponent_score
-            # to compute your strategy
-            if len(opponent_history)==0: #It's the first round: collude
-<<<<<<< HEAD
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'c' #otherwise collude
-=======
-                return 'b'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'b' #otherwise collude
->>>>>>> origin/master
-    
-
-
-
-
-
-
-
-
-
+                    expected = self.responses[(history[-1],
+                                               opponent_history[-1])]
+                move = probe(function, history, opponent_history)
+                if move != expected:
+                    raise ValueError('%s plays %r after %r/%r, table says '
+                                     '%r' % (function.__name__, move,
+                                             history, opponent_history,
+                                             expected))
+
+# the longest memory compile_memory() makes a table for: the table has
+# about 4**memory entries, and checking it takes 4**(memory+1) calls
+COMPILED_MEMORY = 6
+
+class MemoryTable(object):
+    '''
+    The moves of a deterministic strategy with a memory of memory rounds,
+    worked out in advance for every history that can matter, so a match
+    can be played by looking the moves up.
+    The last rounds are kept as an integer state: each round adds two bits,
+    the player's own move then the opponent's, 1 for 'b', and only the last
+    memory rounds are kept. In round number round (from 0), the move is
+    moves[offsets[min(round, memory)] + state]: 0 for 'c', 1 for 'b'.
+    '''
+    def __init__(self, memory, moves):
+        self.memory = memory
+        self.moves = moves
+        self.offsets = [(4**length - 1)//3 for length in range(memory + 1)]
+        self.mask = 4**memory - 1
 
-    ######
-    ######       
-    #
-    elif player == 7:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'loyal vengeful'
-=======
-            return 'AhnafC'
->>>>>>> origin/master
+def histories_from_state(state, length):
+    '''
+    Returns 2-tuple of strings (history, opponent_history): the length
+    rounds encoded in a MemoryTable state, oldest first.
+    '''
+    history = []
+    opponent_history = []
+    for round in range(length - 1, -1, -1):
+        bits = (state >> (2*round)) & 3
+        history.append('cb'[bits >> 1])
+        opponent_history.append('cb'[bits & 1])
+    return (''.join(history), ''.join(opponent_history))
+
+def probe(function, history, opponent_history):
+    '''Returns function's move after the two histories, given as strings.'''
+    context = MatchContext(stats=MatchStats.from_histories(history,
+                                                           opponent_history))
+    return function(History(history), History(opponent_history), 0, 0,
+                    context)
+
+def compile_memory(function, memory):
+    '''
+    Returns a MemoryTable for a deterministic strategy function that
+    declares a memory of memory rounds, made by calling it once for each
+    history of up to memory rounds, or None if the memory is longer than
+    COMPILED_MEMORY or the function makes an invalid move.
+    The table is then checked against the function for every history of
+    memory + 1 rounds; ValueError is raised if the function depends on more
+    than the last memory rounds after all.
+    '''
+    if memory > COMPILED_MEMORY:
+        return None
+    moves = []
+    for length in range(memory + 1):
+        for state in range(4**length):
+            move = probe(function, *histories_from_state(state, length))
+            if move not in ('c', 'b'):
+                return None
+            moves.append('cb'.index(move))
+    table = MemoryTable(memory, moves)
+    for state in range(4**(memory + 1)):
+        history, opponent_history = histories_from_state(state, memory + 1)
+        move = probe(function, history, opponent_history)
+        expected = 'cb'[moves[table.offsets[memory] + (state & table.mask)]]
+        if move != expected:
+            raise ValueError('%s plays %r after %r/%r, but %r after the last '
+                             '%d of those rounds' %
+                             (function.__name__, move, history,
+                              opponent_history, expected, memory))
+    return table
+
+def play_memory_tables(table1, table2, number_of_rounds, payoff=None):
+    '''
+    Plays a match between two strategies compiled to MemoryTables, looking
+    each move up from the integer states instead of calling the strategies.
+    Like play_match(), the rest of the match is fast-forwarded as soon as
+    the last rounds repeat.
+    Returns the same 5-tuple as play_match().
+    '''
+    if payoff is None:
+        payoff = DEFAULT_PAYOFF
+    # points for each round, by move1*2 + move2
+    points = [payoff.points[(action1, action2)]
+              for action1 in 'cb' for action2 in 'cb']
+    moves1, offsets1, mask1 = table1.moves, table1.offsets, table1.mask
+    moves2, offsets2, mask2 = table2.moves, table2.offsets, table2.mask
+    memory1 = table1.memory
+    memory2 = table2.memory
+    window = max(memory1, memory2)
+    played1 = bytearray()
+    played2 = bytearray()
+    state1 = 0
+    state2 = 0
+    score1 = 0
+    score2 = 0
+    scores = [(0, 0)]
+    first_seen = {}
+    for round in range(number_of_rounds):
+        move1 = moves1[offsets1[min(round, memory1)] + state1]
+        move2 = moves2[offsets2[min(round, memory2)] + state2]
+        played1.append(move1)
+        played2.append(move2)
+        points1, points2 = points[move1*2 + move2]
+        score1 += points1
+        score2 += points2
+        state1 = ((state1 << 2) | (move1 << 1) | move2) & mask1
+        state2 = ((state2 << 2) | (move2 << 1) | move1) & mask2
+        played = round + 1
+        scores.append((score1, score2))
+        if played < window:
+            continue
+        # together the states hold the last window rounds of both players
+        if (state1, state2) in first_seen:
+            return fast_forward(History(moves_from_codes(played1)),
+                                History(moves_from_codes(played2)),
+                                scores, first_seen[(state1, state2)],
+                                number_of_rounds)
+        first_seen[(state1, state2)] = played
+    return (History(moves_from_codes(played1)),
+            History(moves_from_codes(played2)), score1, score2, None)
+
+# Collude at first, then only betray after being a sucker
+LOYAL_VENGEFUL = MemoryOne('c', cc='c', cb='b', bc='c', bb='c')
+# Betray every round
+ALWAYS_BETRAY = MemoryOne('b', cc='b', cb='b', bc='b', bb='b')
+
+# Every team's strategy, by player number
+STRATEGIES = {}
+
+class Strategy(object):
+    '''
+    A team's strategy as entered with @strategy: the player number, the
+    team name, and the function that chooses each move. The function is
+    called as function(history, opponent_history, score, opponent_score,
+    context) and returns 'c' or 'b'; see get_action() for the parameters.
+    deterministic is True if the moves depend only on the two histories:
+    no random choices and no use of the scores or points.
+    memory_one is the strategy's MemoryOne table, if it has one; checked is
+    True once memory_one_table() has checked it against the function.
+    memory is the number of recent rounds the strategy looks at, if that
+    is bounded: once that many rounds have been played, each move depends
+    only on the last memory rounds of the two histories.
+    batch is the strategy's batched form, if it has one: see
+    play_batched().
+    table is the MemoryTable compile_memory() made for a strategy with a
+    short enough memory, or None; it is made the first time memory_table()
+    is asked for it, and compiled is True from then on.
+    '''
+    def __init__(self, player, team_name, function, deterministic=False,
+                 memory_one=None, memory=None, batch=None):
+        if memory_one is not None and memory is None:
+            memory = 1
+        self.player = player
+        self.team_name = team_name
+        self.function = function
+        self.deterministic = (deterministic or memory is not None or
+                              batch is not None)
+        self.memory_one = memory_one
+        self.checked = False
+        self.memory = memory
+        self.batch = batch
+        self.table = None
+        self.compiled = False
+
+def strategy(player, team_name, deterministic=False, memory_one=None,
+             memory=None, batch=None):
+    '''
+    Decorator that enters a strategy function in the tournament as player
+    number player, for example
+        @strategy(22, 'always colludes', deterministic=True)
+        def player22(history, opponent_history, score, opponent_score, context):
+            return 'c'
+    Declare deterministic=True only if the moves depend on nothing but
+    the two histories; the engine then skips work it knows will not change.
+    A strategy that only looks at the round before can declare its
+    MemoryOne table as memory_one, and two such strategies play each other
+    with play_memory_one(). The table is checked against the function when
+    first used.
+    A deterministic strategy that only looks at the last few rounds once
+    the match is under way can declare how many as memory; matches between
+    two such strategies are fast-forwarded once they start repeating, and
+    if the memory is short they are played from tables compile_memory()
+    makes, which are checked against the function when first used.
+    A deterministic strategy can also give a batched form of itself as
+    batch, to play many matches a round at a time; see play_batched().
+    Declaring memory_one, memory or batch also declares deterministic.
+    '''
+    def register(function):
+        if player in STRATEGIES:
+            raise ValueError('player %d is already %r' %
+                             (player, STRATEGIES[player].team_name))
+        STRATEGIES[player] = Strategy(player, team_name, function,
+                                      deterministic, memory_one, memory,
+                                      batch)
+        return function
+    return register
+
+def memory_table(player):
+    '''
+    Returns player's MemoryTable, compiling it the first time, or None if
+    it has none.
+    '''
+    strategy = STRATEGIES.get(player)
+    if strategy is None or strategy.memory is None:
+        return None
+    if not strategy.compiled:
+        strategy.table = compile_memory(strategy.function, strategy.memory)
+        strategy.compiled = True
+    return strategy.table
+
+def memory_one_table(player):
+    '''
+    Returns player's MemoryOne table, checking it against the function the
+    first time, or None if it has none.
+    '''
+    strategy = STRATEGIES.get(player)
+    if strategy is None or strategy.memory_one is None:
+        return None
+    if not strategy.checked:
+        strategy.memory_one.check(strategy.function)
+        strategy.checked = True
+    return strategy.memory_one
+
+def memory_one_batch(table, function):
+    '''
+    Returns the batched form of a memory-one strategy, which looks each
+    move up in its MemoryOne table. After a round with an invalid move,
+    which the table does not cover, function is asked instead.
+    '''
+    import numpy
+    codes = {'c': 0, 'b': 1}
+    opening = codes[table.opening]
+    lookup = numpy.zeros((2, 2), dtype=numpy.uint8)
+    for (move, opponent_move), response in table.responses.items():
+        lookup[codes[move], codes[opponent_move]] = codes[response]
+    def batch(histories, opponent_histories):
+        if histories.shape[1] == 0:
+            return numpy.full(histories.shape[0], opening, dtype=numpy.uint8)
+        last = histories[:, -1]
+        opponent_last = opponent_histories[:, -1]
+        moves = lookup[numpy.minimum(last, 1), numpy.minimum(opponent_last, 1)]
+        for row in numpy.nonzero((last > 1) | (opponent_last > 1))[0]:
+            history = History(moves_from_codes(histories[row]))
+            opponent_history = History(moves_from_codes(
+                opponent_histories[row]))
+            context = MatchContext(stats=MatchStats.from_histories(
+                history, opponent_history))
+            move = function(history, opponent_history, 0, 0, context)
+            moves[row] = codes.get(move, 2)
+        return moves
+    return batch
+
+def batch_function(player):
+    '''
+    Returns player's batched form, as declared or worked out from its
+    MemoryOne table, or None if it has none.
+    '''
+    strategy = STRATEGIES.get(player)
+    if strategy is None:
+        return None
+    if strategy.batch is not None:
+        return strategy.batch
+    if strategy.memory_one is not None:
+        return memory_one_batch(memory_one_table(player), strategy.function)
+    return None
+
+def match_window(player1, player2):
+    '''
+    Returns the number of recent rounds that decide every later move in a
+    match between player1 and player2, or None if either strategy does not
+    declare a memory.
+    '''
+    strategy1 = STRATEGIES.get(player1)
+    strategy2 = STRATEGIES.get(player2)
+    if strategy1 is None or strategy1.memory is None or \
+            strategy2 is None or strategy2.memory is None:
+        return None
+    return max(strategy1.memory, strategy2.memory)
+
+def is_deterministic(player):
+    '''Returns True if player's strategy is declared deterministic.'''
+    strategy = STRATEGIES.get(player)
+    return strategy is not None and strategy.deterministic
+
+def get_strategy(key):
+    '''
+    Returns the Strategy entered as key, which is either a player number or
+    a team name. Raises KeyError if there is no such strategy, or if more
+    than one player has that team name.
+    '''
+    if key in STRATEGIES:
+        return STRATEGIES[key]
+    players = [player for player in sorted(STRATEGIES)
+               if STRATEGIES[player].team_name == key]
+    if len(players) != 1:
+        raise KeyError('%r names %d strategies' % (key, len(players)))
+    return STRATEGIES[players[0]]
+
+def no_strategy(history, opponent_history, score, opponent_score, context):
+    # players without a strategy never make a valid move
+    return None
+
+def resolve_strategy(player):
+    '''
+    Returns the function that chooses player's moves. Looking it up once
+    per match means playing each round is a single function call, however
+    many strategies there are. player may also be such a function already.
+    '''
+    if callable(player):
+        return player
+    strategy = STRATEGIES.get(player)
+    if strategy is None:
+        return no_strategy
+    return strategy.function
+
+def get_action(player, history, opponent_history, score, opponent_score, getting_team_name=False, context=None):
+    '''Gets the strategy for the player, given their own history and that of
+    their opponent, as well as the current scores within this pairing.
+    The parameters history and opponenet history are History objects, which
+    behave like strings with one letter per round that has been played so
+    far: either an 'c' for collude or a 'b' for betray.
+    The function should return one character, 'c' or 'b'. 
+    The history strings have the first round between these two players 
+    as the first character and the most recent round as the last character.
+    context is the player's MatchContext: context.stats has running totals
+    for the match so far, context.state keeps anything else the strategy
+    remembers during the match, and strategies that make random choices
+    must use context.rng instead of the random module. If no context is
+    given, one is built from the histories, with an empty state.
+    Each team's code is now a function entered with @strategy below;
+    get_action() looks the player up in STRATEGIES.'''
+    strategy = STRATEGIES.get(player)
+    if strategy is None:
+        return None
+    if getting_team_name:
+        return strategy.team_name
+    if context is None:
+        context = MatchContext(stats=MatchStats.from_histories(
+            history, opponent_history))
+    return strategy.function(history, opponent_history, score, opponent_score,
+                             context)
+
+######
+######
+#
+# This nonexample player nearly always colludes... right?
+@strategy(0, 'KNTH!!')
+def player0(history, opponent_history, score, opponent_score, context):
+    KNTH = context.state
+    if len(history) == 0: #if it's the first round, collude since I'm hoepful
+        KNTH.BTotal = 0 # points scored before each move, by move
+        KNTH.CTotal = 0
+        KNTH.CCount = 0
+        KNTH.LastPayoff = 0
+        return 'c'
+    else:
+      # each move is credited with the points from the round before it
+      if history[-1] == 'b':
+          KNTH.BTotal += KNTH.LastPayoff
+      elif history[-1] == 'c':
+          KNTH.CTotal += KNTH.LastPayoff
+          KNTH.CCount += 1
+      KNTH.LastPayoff = context.stats.last_payoff
+      KNTHBAverage = KNTH.BTotal/len(history)
+      KNTHCAverage = KNTH.CTotal/KNTH.CCount
+      if len(history) ==  1:# if it's the second round, betray... I've got a bad feeling about this...
+        return 'b'
+      elif KNTHCAverage > KNTHBAverage:
+        return 'c'
+      elif opponent_score < -300: #otherwise if the opponent is doing pretty badly collude, we should work together
+          return 'c'
+      elif opponent_score < score:#same reasoning
+          #print('My opponent is losin\'!!')
+          return 'c'
+      else: #if nothing else is true, then betray, at least the other person will feel worse
+          #print('My opponent is winning!!')
+          return 'b'
+
+
+
+######
+######
+#
+#This example player always betrays.      
+@strategy(1, 'Marco and Max', memory=3)
+def player1(history, opponent_history, score, opponent_score, context):
+    if len(history) > 2:
+        if opponent_history[-1] == 'c' and opponent_history[-2] == 'c' and opponent_history[-3] == 'c':
+            return 'c'
         else:
-            # use history, opponent_history, score, opponent_score
-            # to compute your strategy
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were sucker last time
-            else:
-                return 'c' #otherwise collude
-
-
+            return 'b'
+    else:
+        return 'b'
 
 
 
+######
+######
+#This example player is silent at first and then 
+#only betrays if they were a sucker last round.
+@strategy(2, 'Ping and Caden', memory_one=LOYAL_VENGEFUL)
+def player2(history, opponent_history, score, opponent_score, context):
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'c'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b' # betray if they were severely punished last time
+    else:
+        return 'c' #otherwise collude
 
 
 
+######
+######
+#
+@strategy(3, 'Ping and Caden', memory=5)
+def player3(history, opponent_history, score, opponent_score, context):
+    if len(opponent_history)<5: # Collude for first 5 rounds
+        return 'c'
+    else:
+        return opponent_history[-1] # Do whatever opponet did last round
 
 
 
-    ######
-    ######        
-    #
-    elif player == 8:
-        if getting_team_name:
-            #if there was a previous round just like 
-<<<<<<< HEAD
-            return 'loyal vengeful with permanent second impression'
-=======
-            return 'Mitchell'
->>>>>>> origin/master
+######
+######
+#
+@strategy(4, 'Marco and Max', memory=3)
+def player4(history, opponent_history, score, opponent_score, context):
+    if len(history) > 2:
+        if opponent_history[-1] == 'c' and opponent_history[-2] == 'c' and opponent_history[-3] == 'c':
+            return 'c'
         else:
-            # use history, opponent_history, score, opponent_score
-            # to compute your strategy      
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            else:
-                # if there was a previous round just like the last one,
-                # do whatever they did in the round that followed it
-                recent_round_opponent = opponent_history[-1]
-                recent_round_me = history[-1]
-                            
-                #go through rounds before that one
-                for round in range(len(history)-1):
-                    prior_round_opponent = opponent_history[round]
-                    prior_round_me = history[round]
-                    #if one matches
-                    if (prior_round_me == recent_round_me) and \
-                            (prior_round_opponent == recent_round_opponent):
-                        return opponent_history[round]
-                # no match found
-                if history[-1]=='c' and opponent_history[-1]=='b':
-                    return 'b' # betray is they were severely punished last time
-                else:
-                    return 'c' #otherwise collude
-
-
-
-
-
-
-
-
-
-
-
-
-    ######
-    ######
-    #
-    elif player == 9:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'loyal vengeful'
+            return 'b'
+    else:
+        return 'b'
+
+
+
+######
+######        
+#
+@strategy(5, 'Liam?', deterministic=True)
+def player5(history, opponent_history, score, opponent_score, context):
+    if len(opponent_history)==0:
+        return 'c'
+    else:
+        recent_round_opponent = opponent_history[-1]
+        recent_round_me = history[-1]
+        #if an earlier round matches
+        if context.stats.pair_counts[
+                (recent_round_me, recent_round_opponent)] > 1:
+            return recent_round_opponent
+        if history[-1]=='c' and opponent_history[-1]=='b':
+            return 'b' # betray is they were severely punished last time
         else:
-            # use history, opponent_history, score, opponent_score
-            # to compute your strategy
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'c' #otherwise collude
-=======
-            return 'Juichi and Willow'
+            return 'c' #otherwise collude 
+
+
+
+######
+######        
+#
+@strategy(6, 'Dat1AZNBanana', memory_one=ALWAYS_BETRAY)
+def player6(history, opponent_history, score, opponent_score, context):
+    # use history, opponent_history, score, opponent_score
+    # to compute your strategy
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'b'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b' # betray is they were severely punished last time
+    else:
+        return 'b' #otherwise collude
+
+
+
+######
+######       
+#
+@strategy(7, 'AhnafC', memory_one=LOYAL_VENGEFUL)
+def player7(history, opponent_history, score, opponent_score, context):
+    # use history, opponent_history, score, opponent_score
+    # to compute your strategy
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'c'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b' # betray is they were sucker last time
+    else:
+        return 'c' #otherwise collude
+
+
+
+######
+######        
+#
+@strategy(8, 'Mitchell', deterministic=True)
+def player8(history, opponent_history, score, opponent_score, context):
+    # use history, opponent_history, score, opponent_score
+    # to compute your strategy      
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'c'
+    else:
+        # if there was a previous round just like the last one,
+        # do whatever they did in the round that followed it
+        recent_round_opponent = opponent_history[-1]
+        recent_round_me = history[-1]
+
+        #count the rounds before that one that match it;
+        #the opponent played the same move in all of them
+        if context.stats.pair_counts[
+                (recent_round_me, recent_round_opponent)] > 1:
+            return recent_round_opponent
+        # no match found
+        if history[-1]=='c' and opponent_history[-1]=='b':
+            return 'b' # betray is they were severely punished last time
         else:
-            if len(opponent_history)==0:
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b'
-            else:
-                return 'c'
-
->>>>>>> origin/master
-
-
-
-
-
-
-
-
-
-
-    ######
-    ######
-    #
-    elif player == 10:
-        if getting_team_name:
-            return 'loyal vengeful'
+            return 'c' #otherwise collude
+
+
+
+######
+######
+#
+@strategy(9, 'Juichi and Willow', memory_one=LOYAL_VENGEFUL)
+def player9(history, opponent_history, score, opponent_score, context):
+    if len(opponent_history)==0:
+        return 'c'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b'
+    else:
+        return 'c'
+
+
+
+######
+######
+#
+@strategy(10, 'loyal vengeful', memory_one=LOYAL_VENGEFUL)
+def player10(history, opponent_history, score, opponent_score, context):
+    # use history, opponent_history, score, opponent_score
+    # to compute your strategy
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'c'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b' # betray is they were severely punished last time
+    else:
+        return 'c' #otherwise collude
+
+
+
+######
+######
+#
+@strategy(11, 'CJ', memory_one=ALWAYS_BETRAY)
+def player11(history, opponent_history, score, opponent_score, context):
+    return 'b'
+
+
+
+######
+######
+#
+@strategy(12, 'loyal vengeful', memory_one=LOYAL_VENGEFUL)
+def player12(history, opponent_history, score, opponent_score, context):
+    # use history, opponent_history, score, opponent_score
+    # to compute your strategy
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'c'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b' # betray is they were severely punished last time
+    else:
+        return 'c' #otherwise collude
+
+
+
+######
+######
+#
+@strategy(13, 'Bryson', memory_one=LOYAL_VENGEFUL)
+def player13(history, opponent_history, score, opponent_score, context):
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'c'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b' # betray is they were severely punished last time
+    else:
+        return 'c' #otherwise collude
+
+
+
+######
+######
+#
+@strategy(14, 'DK! Dillon Kong!')
+def player14(history, opponent_history, score, opponent_score, context):
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'c'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b' # betray is they were severely punished last time
+    else:
+        if context.rng.random()<0.1: #10% of the other rounds
+            return 'b'         #betray
         else:
-            # use history, opponent_history, score, opponent_score
-            # to compute your strategy
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'c' #otherwise collude
-
-
+            return 'c'         #otherwise collude
 
 
 
+######
+######
+#
+@strategy(15, 'Juichi', memory_one=LOYAL_VENGEFUL)
+def player15(history, opponent_history, score, opponent_score, context):
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'c'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b' # betray is they were severely punished last time
+    else:
+        return 'c' #otherwise collude
 
 
 
-
-    ######
-    ######
-    #
-    elif player == 11:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'loyal vengeful'
-        else:
-            # use history, opponent_history, score, opponent_score
-            # to compute your strategy
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'c' #otherwise collude
-=======
-            return 'CJ'
+######
+######
+#
+@strategy(16, 'nick hills bad bot')
+def player16(history, opponent_history, score, opponent_score, context):
+    if len(opponent_history)==0: #opener
+        if context.rng.random() <= 0.5:
+            return 'c'
         else:
             return 'b'
->>>>>>> origin/master
-
-
-
 
+    else:
+        #count previous betrayals, not counting the opener
+        prev_betrays = context.stats.opponent_betrayals
+        if opponent_history[0] == 'b':
+            prev_betrays = prev_betrays - 1
 
+        betray_chance = prev_betrays / len(opponent_history) #calculate chance of the next choice being a betrayal
 
+        if opponent_history[-1] == 'b': #if last opponent choice was betray, add 75% to betray chance
+            betray_chance = betray_chance + 0.75
 
+        if context.rng.random() <= betray_chance: #if float lands in betray chance range, betray
+            return 'b'
+        else: #collude by default
+            return 'c'
 
 
 
-    ######
-    ######
-    #
-    elif player == 12:
-        if getting_team_name:
-            return 'loyal vengeful'
-        else:
-            # use history, opponent_history, score, opponent_score
-            # to compute your strategy
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'c' #otherwise collude
-    
-    
-
-
-    ######
-    ######
-    #
-    elif player == 13:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'loyal vengeful'
-=======
-            return 'Bryson'
->>>>>>> origin/master
-        else:
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'c' #otherwise collude
-    
-    
-
-
-
-
+######
+######
+#
+@strategy(17, 'Ryo Takei', memory_one=LOYAL_VENGEFUL)
+def player17(history, opponent_history, score, opponent_score, context):
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'c'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b' # betray is they were severely punished last time
+    else:
+        return 'c' #otherwise collude
+
+
+
+######
+######
+#
+@strategy(18, 'loyal vengeful', memory_one=LOYAL_VENGEFUL)
+def player18(history, opponent_history, score, opponent_score, context):
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'c'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b' # betray is they were severely punished last time
+    else:
+        return 'c' #otherwise collude
+
+
+
+######
+######
+#
+@strategy(19, 'Ben', memory_one=LOYAL_VENGEFUL)
+def player19(history, opponent_history, score, opponent_score, context):
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'c'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b' # betray is they were severely punished last time
+    elif history[-1]=='b' and opponent_history[-1]=='b':
+        return 'c' # collude if they were punished last time
+    elif history[-1]=='b' and opponent_history[-1]=='c':
+        return 'c' # collude if they were set free
+    else:
+        return 'c' #otherwise collude
+
+
+
+######
+######
+#
+@strategy(20, 'loyal vengeful', memory_one=LOYAL_VENGEFUL)
+def player20(history, opponent_history, score, opponent_score, context):
+    if len(opponent_history)==0: #It's the first round: collude
+        return 'c'
+    elif history[-1]=='c' and opponent_history[-1]=='b':
+        return 'b' # betray is they were severely punished last time
+    else:
+        return 'c' #otherwise collude
+
+
+
+######
+######
+#
+@strategy(21, 'Rafa', memory_one=ALWAYS_BETRAY)
+def player21(history, opponent_history, score, opponent_score, context):
+    return 'b'
+
+class TournamentResults(object):
+    '''
+    The results of a tournament, filled in one match at a time with
+    add_match().
+    team_names[player] is each player's team name, looked up in STRATEGIES
+        unless team_names is given
+    result_table[player1][player2] is player1's score per round against
+        player2; the diagonal is 0
+    moves_table[player1][player2] is player1's moves against player2, if
+        the moves are kept (keep_moves); otherwise moves_table is None
+    scores[player] is the total of player's scores per round
+    rounds_table[player1][player2] is the number of rounds player1 and
+        player2 played
+    cooperation_table[player1][player2] is the fraction of those rounds in
+        which player1 cooperated
+    fast_forwards[(player1, player2)] is the number of rounds played before
+        the rest of that match was fast-forwarded, for matches that were
+    '''
+    def __init__(self, num_players, keep_moves=True, team_names=None):
+        self.num_players = num_players
+        #create a list of zeros, one per player
+        self.scores = [0] * num_players
+        
+        ''' Get the team name from each team algorithm'''
+        if team_names is None:
+            team_names = [get_action(player,'','',0,0,getting_team_name=True)
+                          for player in range(num_players)]
+        self.team_names = list(team_names)
+        
+        # each element will become a column for each player
+        # range is just to get list of correct size
+        self.result_table = list(range(num_players))
+        self.moves_table = None
+        if keep_moves:
+            self.moves_table = list(range(num_players))
+        for player1 in range(num_players):  
+            # create the column for each player
+            # range just to get list of correct size
+            self.result_table[player1] = list(range(num_players))
+            self.result_table[player1][player1]=0 # initialize unused diagonal to 0
+            if keep_moves:
+                self.moves_table[player1] = list(range(num_players))
+        self.rounds_table = [[0]*num_players for player in range(num_players)]
+        self.cooperation_table = [[0.0]*num_players
+                                  for player in range(num_players)]
+        self.fast_forwards = {}
+
+    def add_match(self, player1, player2, moves1, moves2, score1, score2,
+                  fast_forwarded=None):
+        rounds = len(moves1)
+        score1_per_round = score1/rounds 
+        score2_per_round = score2/rounds
+        
+        self.result_table[player1][player2]=score1_per_round
+        self.result_table[player2][player1]=score2_per_round
+        
+        if self.moves_table is not None:
+            self.moves_table[player1][player2] = moves1
+            self.moves_table[player2][player1] = moves2
+        self.rounds_table[player1][player2] = rounds
+        self.rounds_table[player2][player1] = rounds
+        self.cooperation_table[player1][player2] = moves1.count('c')*1.0/rounds
+        self.cooperation_table[player2][player1] = moves2.count('c')*1.0/rounds
+        
+        #accumulate the results for the two players
+        self.scores[player1] += score1*1.0/len(moves1)#ends up same as column sum
+        self.scores[player2] += score2*1.0/len(moves2)#ends up same as column sum
+        
+        if fast_forwarded is not None:
+            self.fast_forwards[(player1, player2)] = fast_forwarded
 
+def tournament_pairs(num_players):
+    '''
+    Returns the list of (player1, player2) pairings of a tournament: each
+    player against every other player of lower number, in the order the
+    matches are reported.
+    '''
+    return [(player1, player2) for player1 in range(num_players)
+            for player2 in range(player1)]
 
+def play_pair(job):
+    '''
+    Plays one pairing of the tournament. job is a
+    (player1, player2, seed, repetition, payoff) tuple, where seed is the
+    tournament seed; the match uses match_rng() for its random choices and
+    is scored with payoff, a PayoffMatrix.
+    Returns 7-tuple
+    (player1, player2, moves1, moves2, score1, score2, fast_forwarded)
+    with the last five as play_match() returns them.
+    '''
+    player1, player2, seed, repetition, payoff = job
+    rng = match_rng(seed, player1, player2, repetition)
+    return (player1, player2) + play_match(player1, player2, rng, payoff)
 
-    ######
-    ######
-    #
-    elif player == 14:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'loyal vengeful occasionally greedy'
-=======
-            return 'DK! Dillon Kong!'
->>>>>>> origin/master
-        else:
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                if random.random()<0.1: #10% of the other rounds
-                    return 'b'         #betray
-                else:
-                    return 'c'         #otherwise collude
-    
-    
-    
-    
+def play_profiled_pair(job):
+    '''
+    Plays a job in a worker process while profiling. Returns 2-tuple
+    (result, timings): play_pair(job) and the Profile's timings, so they
+    can be merged into those of the process that hands out the jobs.
+    '''
+    timings = start_profile().timings
+    try:
+        return (play_pair(job), timings)
+    finally:
+        stop_profile()
 
+# matches scored at once by play_batched()
+BATCH_BLOCK = 4096
 
+def play_batched(jobs):
+    '''
+    Plays all the matches in jobs (play_pair() jobs) a round at a time, in
+    lockstep, asking each strategy for its moves in all of its matches at
+    once: one call per strategy per round instead of one per match. Every
+    player in jobs needs a batched form (see batch_function()).
+    A batched form is called as batch(histories, opponent_histories) with
+    two 2-D NumPy arrays of move codes (see move_codes()), one row per
+    match the strategy is still playing and one column per round played so
+    far, and returns a 1-D array with the code of its move in each of those
+    matches; a code other than 0 or 1 is an invalid move.
+    Returns a list of the play_pair() results in job order. The moves and
+    scores are those play_pair() gives; since every round is played,
+    fast_forwarded is always None.
+    '''
+    import numpy
+    lengths = [match_rng(seed, player1, player2, repetition).randint(
+                   ROUNDS[0], ROUNDS[1])
+               for player1, player2, seed, repetition, payoff in jobs]
+    # each match has two sides, one for each player; the sides are laid out
+    # player by player, each player's longest matches first, so the sides a
+    # player is still playing are always one slice
+    sides = {}
+    for index, job in enumerate(jobs):
+        sides.setdefault(job[0], []).append((-lengths[index], index, 0))
+        sides.setdefault(job[1], []).append((-lengths[index], index, 1))
+    position = {}
+    players = []
+    for player in sorted(sides):
+        start = len(position)
+        for length, index, side in sorted(sides[player]):
+            position[(index, side)] = len(position)
+        side_lengths = numpy.array([-length for length, index, side
+                                    in sorted(sides[player])])
+        players.append((batch_function(player), start, side_lengths))
+    size = len(position)
+    opponent = numpy.empty(size, dtype=numpy.intp)
+    for (index, side), place in position.items():
+        opponent[place] = position[(index, 1 - side)]
+    longest = max(lengths) if lengths else 0
+    # one column per round, so writing a round's moves is one column
+    moves = numpy.zeros((size, longest), dtype=numpy.uint8, order='F')
+    opponent_moves = numpy.zeros((size, longest), dtype=numpy.uint8,
+                                 order='F')
+    round_moves = numpy.zeros(size, dtype=numpy.uint8)
+    for round in range(longest):
+        for batch, start, side_lengths in players:
+            playing = numpy.count_nonzero(side_lengths > round)
+            if playing == 0:
+                continue
+            end = start + playing
+            played = numpy.asarray(batch(moves[start:end, :round],
+                                         opponent_moves[start:end, :round]))
+            round_moves[start:end] = numpy.where(
+                (played == 0) | (played == 1), played, 2)
+        moves[:, round] = round_moves
+        opponent_moves[:, round] = round_moves[opponent]
+    # score the matches a block at a time, with rows in round order
+    moves = numpy.ascontiguousarray(moves)
+    first = numpy.array([position[(index, 0)] for index in range(len(jobs))],
+                        dtype=numpy.intp)
+    second = numpy.array([position[(index, 1)] for index in range(len(jobs))],
+                         dtype=numpy.intp)
+    lengths = numpy.array(lengths, dtype=numpy.intp)
+    groups = {}
+    for index, job in enumerate(jobs):
+        payoff = job[4]
+        key = payoff.values() if payoff is not None else None
+        groups.setdefault(key, (payoff, []))[1].append(index)
+    # plain Python numbers, integers or floats as the payoffs are
+    scores1 = [0]*len(jobs)
+    scores2 = [0]*len(jobs)
+    for payoff, indexes in groups.values():
+        points1, points2 = payoff_tables(payoff)
+        for block in range(0, len(indexes), BATCH_BLOCK):
+            chosen = numpy.array(indexes[block:block + BATCH_BLOCK])
+            codes1 = moves[first[chosen]]
+            codes2 = moves[second[chosen]]
+            # rounds after a match is over hold code 0 and score nothing
+            over = numpy.arange(longest) >= lengths[chosen, None]
+            totals1 = numpy.where(over, 0, points1[codes1, codes2]).sum(1)
+            totals2 = numpy.where(over, 0, points2[codes1, codes2]).sum(1)
+            for index, total1, total2 in zip(chosen.tolist(),
+                                             totals1.tolist(),
+                                             totals2.tolist()):
+                scores1[index] = total1
+                scores2[index] = total2
+    results = []
+    for index, (player1, player2, seed, repetition, payoff) in \
+            enumerate(jobs):
+        length = lengths[index]
+        results.append((player1, player2,
+                        History(moves_from_codes(moves[first[index], :length])),
+                        History(moves_from_codes(moves[second[index], :length])),
+                        scores1[index], scores2[index], None))
+    return results
+
+def batched_pair(player1, player2):
+    '''
+    Returns True if play_batched_pairs() plays player1 against player2
+    with play_batched().
+    '''
+    declared = [player for player in (player1, player2)
+                if STRATEGIES.get(player) is not None and
+                STRATEGIES[player].batch is not None]
+    return (bool(declared) and batch_function(player1) is not None and
+            batch_function(player2) is not None)
 
-    ######
-    ######
-    #
-    elif player == 15:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'loyal vengeful'
-=======
-            return 'Juichi'
->>>>>>> origin/master
+def play_batched_pairs(jobs, workers=None, cache=None):
+    '''
+    Yields the same as play_pairs(), but plays the jobs whose players both
+    have a batched form, and at least one of them declared it, together
+    with play_batched(), and only the rest with play_pairs(). Two
+    memory-one strategies still play each other with play_memory_one(),
+    which is faster and fast-forwards the match.
+    '''
+    batched = [batched_pair(job[0], job[1]) for job in jobs]
+    together = iter(())
+    if any(batched):
+        together = iter(play_batched([job for job, in_batch
+                                      in zip(jobs, batched) if in_batch]))
+    rest = play_pairs([job for job, in_batch in zip(jobs, batched)
+                       if not in_batch], workers, cache)
+    for in_batch in batched:
+        if in_batch:
+            yield next(together)
         else:
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'c' #otherwise collude
-    
-    
-
-
-
+            yield next(rest)
 
-
-
-
-    ######
-    ######
-    #
-    elif player == 16:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'loyal vengeful'
-        else:
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'c' #otherwise collude
-=======
-            return 'nick hills bad bot'
+def play_pairs(jobs, workers=None, cache=None):
+    '''
+    Yields play_pair(job) for each job in jobs, in the same order as jobs.
+    With workers > 1 the jobs are shared out over a pool of that many
+    processes; the results are still yielded in job order.
+    With a MatchCache, matches it already has are not played again, and
+    the ones that are played are added to it. The cache is not used while
+    a time budget is on (see Budget), since the results then depend on
+    how fast the strategies ran.
+    '''
+    if cache is not None and BUDGET is None:
+        for result in play_cached_pairs(jobs, workers, cache):
+            yield result
+        return
+    if not workers or workers <= 1:
+        for job in jobs:
+            yield play_pair(job)
+        return
+    import multiprocessing
+    if BUDGET is not None:
+        # the strategies already run in the Budget's worker processes, and
+        # a pool's processes may not start processes of their own, so the
+        # matches are shared out over threads of this process instead
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(workers)
+    else:
+        pool = multiprocessing.Pool(workers)
+    try:
+        # a few chunks per worker keeps the pool busy to the end
+        chunksize = max(1, len(jobs) // (workers * 4))
+        if PROFILE is None or BUDGET is not None:
+            for result in pool.imap(play_pair, jobs, chunksize):
+                yield result
         else:
-            if len(opponent_history)==0: #opener
-                if random.random() <= 0.5:
-                    return 'c'
-                else:
-                    return 'b'
-            
+            # the workers time their own calls; gather the figures here
+            for result, timings in pool.imap(play_profiled_pair, jobs,
+                                             chunksize):
+                PROFILE.merge(timings)
+                yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+def play_cached_pairs(jobs, workers, cache):
+    '''
+    Does the work of play_pairs() with a MatchCache: yields each job's
+    result from the cache if it is there, and otherwise plays it and
+    stores it in the cache.
+    Only which jobs are cached is looked up at the start; each cached
+    match is read when its turn comes, so the moves are not all held at
+    once.
+    '''
+    keys = [cache.key(job) for job in jobs]
+    cached = [cache.has(key) for key in keys]
+    missing = [job for job, in_cache in zip(jobs, cached) if not in_cache]
+    played = play_pairs(missing, workers)
+    try:
+        for job, key, in_cache in zip(jobs, keys, cached):
+            match = None
+            if in_cache:
+                match = cache.get(key)
+            if match is not None:
+                result = (job[0], job[1]) + match
+            elif in_cache:
+                # dropped since, to make room for the matches played here
+                result = play_pair(job)
+                cache.put(key, result[2:])
             else:
-                prev_betrays = 0;
-                for i in range(1,len(opponent_history)): #count previous betrayals
-                    if opponent_history[i] == 'b':
-                        prev_betrays = prev_betrays + 1
-                
-                betray_chance = prev_betrays / len(opponent_history) #calculate chance of the next choice being a betrayal
-                
-                if opponent_history[-1] == 'b': #if last opponent choice was betray, add 75% to betray chance
-                    betray_chance = betray_chance + 0.75
-                
-                if random.random() <= betray_chance: #if float lands in betray chance range, betray
-                    return 'b'
-                else: #collude by default
-                    return 'c'
->>>>>>> origin/master
-    
-    
-
-
-
-
-
+                result = next(played)
+                cache.put(key, result[2:])
+            yield result
+    finally:
+        cache.commit()
 
-
-    ######
-    ######
-    #
-    elif player == 17:
-        if getting_team_name:
-<<<<<<< HEAD
-            return 'loyal vengeful'
-=======
-            return 'Ryo Takei'
->>>>>>> origin/master
-        else:
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'c' #otherwise collude
-    
+def strategy_hash(player):
+    '''
+    Returns a hash of the code of player's strategy, which changes whenever
+    the team changes their strategy function.
+    '''
+    import inspect
+    import marshal
+    strategy = STRATEGIES.get(player)
+    if strategy is None:
+        return 'none'
+    try:
+        code = inspect.getsource(strategy.function).encode('utf-8')
+    except (IOError, OSError, TypeError):
+        code = marshal.dumps(strategy.function.__code__)
+    return hashlib.sha256(code).hexdigest()
+
+class MatchCache(object):
+    '''
+    Results of matches already played, kept in an SQLite file so that
+    re-running a tournament only plays the matches that could have changed.
+    A match is looked up by the code of both strategies, the payoffs, the
+    seed, the players, the repetition and ROUNDS, so changing one team's
+    strategy only replays that team's matches.
+    At most max_entries matches are kept; when there are more, the ones
+    used least recently are dropped.
+    '''
+    # bump this when a change to the engine changes match results
+    VERSION = 1
+
+    def __init__(self, path, max_entries=1000000):
+        import sqlite3
+        self.max_entries = max_entries
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS matches (key TEXT PRIMARY KEY, '
+            'moves1 TEXT, moves2 TEXT, score1 INTEGER, score2 INTEGER, '
+            'fast_forwarded INTEGER, last_used INTEGER)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS matches_used '
+                                'ON matches (last_used)')
+        self.entries, last_used = self.connection.execute(
+            'SELECT COUNT(*), MAX(last_used) FROM matches').fetchone()
+        self.clock = last_used or 0
+        self.hashes = {}
+
+    def key(self, job):
+        '''Returns the cache key for a play_pair() job.'''
+        player1, player2, seed, repetition, payoff = job
+        for player in (player1, player2):
+            if player not in self.hashes:
+                self.hashes[player] = strategy_hash(player)
+        if payoff is None:
+            payoff = DEFAULT_PAYOFF
+        key = repr((self.VERSION, self.hashes[player1], self.hashes[player2],
+                    payoff.values(), seed, player1, player2, repetition,
+                    ROUNDS))
+        return hashlib.sha256(key.encode('ascii')).hexdigest()
+
+    def tick(self):
+        self.clock += 1
+        return self.clock
+
+    def has(self, key):
+        '''
+        Returns True if a match is stored under key, without loading it.
+        It counts as used, so it is not the first to be dropped.
+        '''
+        cursor = self.connection.execute('UPDATE matches SET last_used = ? '
+                                         'WHERE key = ?', (self.tick(), key))
+        return cursor.rowcount > 0
+
+    def get(self, key):
+        '''
+        Returns the match stored under key as the 5-tuple play_match()
+        returns, or None if it is not there.
+        '''
+        row = self.connection.execute(
+            'SELECT moves1, moves2, score1, score2, fast_forwarded '
+            'FROM matches WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self.connection.execute('UPDATE matches SET last_used = ? '
+                                'WHERE key = ?', (self.tick(), key))
+        moves1, moves2, score1, score2, fast_forwarded = row
+        return (History(str(moves1)), History(str(moves2)), score1, score2,
+                fast_forwarded)
+
+    def put(self, key, match):
+        '''Stores a match, the 5-tuple play_match() returns, under key.'''
+        moves1, moves2, score1, score2, fast_forwarded = match
+        self.connection.execute(
+            'INSERT OR REPLACE INTO matches VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, str(moves1), str(moves2), score1, score2, fast_forwarded,
+             self.tick()))
+        self.entries += 1
+        if self.entries > self.max_entries:
+            self.entries = self.connection.execute(
+                'SELECT COUNT(*) FROM matches').fetchone()[0]
+        if self.entries > self.max_entries:
+            self.connection.execute(
+                'DELETE FROM matches WHERE key IN (SELECT key FROM matches '
+                'ORDER BY last_used LIMIT ?)',
+                (self.entries - self.max_entries,))
+            self.entries = self.max_entries
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+def sweep_payoffs(num_players, payoffs, seed=None, workers=None, cache=None):
+    '''
+    Plays the same seeded tournament once for each PayoffMatrix in payoffs
+    and returns a list with the TournamentResults for each.
+    With the same seed every match has the same number of rounds whatever
+    the payoffs, so a match between two deterministic strategies always
+    has the same moves: those matches are only played for the first
+    matrix, and their recorded moves are scored again for the others.
+    cache is an optional MatchCache, as for play_tournament().
+    '''
+    if seed is None:
+        seed = random.getrandbits(32)
+    payoffs = list(payoffs)
+    pairs = tournament_pairs(num_players)
+    sweep = []
+    first = TournamentResults(num_players)
+    for result in play_pairs([(player1, player2, seed, 0, payoffs[0])
+                              for player1, player2 in pairs], workers, cache):
+        first.add_match(*result)
+    sweep.append(first)
     
-
-
-
-
-
-
-
-    ######
-    ######
-    #
-    elif player == 18:
-        if getting_team_name:
-            return 'loyal vengeful'
-        else:
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
+    replay = [(player1, player2) for player1, player2 in pairs
+              if not (is_deterministic(player1) and
+                      is_deterministic(player2))]
+    for payoff in payoffs[1:]:
+        tournament = TournamentResults(num_players, keep_moves=False)
+        replayed = play_pairs([(player1, player2, seed, 0, payoff)
+                               for player1, player2 in replay], workers, cache)
+        # add the matches in the usual order, whichever way they were got
+        for player1, player2 in pairs:
+            if is_deterministic(player1) and is_deterministic(player2):
+                moves1 = first.moves_table[player1][player2]
+                moves2 = first.moves_table[player2][player1]
+                score1, score2 = score_history(moves1, moves2, payoff)
+                tournament.add_match(player1, player2, moves1, moves2,
+                                     score1, score2,
+                                     first.fast_forwards.get((player1, player2)))
             else:
-                return 'c' #otherwise collude
-
-elif player == 21:
-    if getting_team_name:
-        return 'Rafa'
-        else:
-            return 'b'
-
-
-
-
-
+                tournament.add_match(*next(replayed))
+        sweep.append(tournament)
+    return sweep
 
-
-
-
-    ######
-    ######
-    #
-<<<<<<< HEAD
-    elif player == 19:
-        if getting_team_name:
-            return 'loyal vengeful'
-=======
- elif player == 19:
-        if getting_team_name:
-            return 'Ben'
->>>>>>> origin/master
+class RunningStats(object):
+    '''
+    The count, mean and variance of a stream of numbers, updated one
+    number at a time with Welford's algorithm, so the numbers themselves
+    are never kept.
+    '''
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 # sum of squared differences from the mean
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta/self.count
+        self.m2 += delta*(value - self.mean)
+
+    def variance(self):
+        '''Returns the sample variance, or 0 with fewer than 2 numbers.'''
+        if self.count < 2:
+            return 0.0
+        return self.m2/(self.count - 1)
+
+    def mean_variance(self):
+        '''Returns the variance of the mean, variance()/count.'''
+        if self.count < 2:
+            return 0.0
+        return self.variance()/self.count
+
+# z for a two-sided 95% confidence interval
+CONFIDENCE_Z = 1.96
+# Student's t for the same, by degrees of freedom from 1
+CONFIDENCE_T = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306,
+                2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120,
+                2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064,
+                2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+# the fewest matches a pairing is played before it can count as settled:
+# with fewer, the sample variance is too rough to trust
+SETTLED_COUNT = 10
+
+def confidence_t(degrees):
+    '''
+    Returns the multiple of the standard error that gives a two-sided 95%
+    confidence interval from a sample with degrees degrees of freedom.
+    '''
+    if degrees <= len(CONFIDENCE_T):
+        return CONFIDENCE_T[degrees - 1]
+    # past the table, the first terms of the expansion around z
+    z = CONFIDENCE_Z
+    return (z + (z**3 + z)/(4.0*degrees) +
+            (5*z**5 + 16*z**3 + 3*z)/(96.0*degrees**2))
+
+class RepeatedResults(object):
+    '''
+    The results of the same tournament repeated with different random
+    streams, filled in one match at a time with add_match() like
+    TournamentResults, but keeping only running statistics, so the memory
+    used does not grow with the number of repetitions.
+    team_names[player] is each player's team name
+    stats[player1][player2] is a RunningStats of player1's score per round
+        against player2; None on the diagonal
+    result_table[player1][player2] is the mean of those scores
+    scores[player] is the total of player's mean scores per round
+    '''
+    def __init__(self, num_players):
+        self.num_players = num_players
+        self.team_names = [get_action(player,'','',0,0,getting_team_name=True)
+                           for player in range(num_players)]
+        self.stats = [[RunningStats() if player1 != player2 else None
+                       for player2 in range(num_players)]
+                      for player1 in range(num_players)]
+
+    def add_match(self, player1, player2, moves1, moves2, score1, score2,
+                  fast_forwarded=None):
+        self.stats[player1][player2].add(score1*1.0/len(moves1))
+        self.stats[player2][player1].add(score2*1.0/len(moves2))
+
+    def half_width(self, player1, player2):
+        '''
+        Returns half the width of the confidence interval of player1's
+        mean score per round against player2, or None before 2 matches.
+        The interval uses Student's t, since there may be few matches.
+        '''
+        stats = self.stats[player1][player2]
+        if stats.count < 2:
+            return None
+        return confidence_t(stats.count - 1)*stats.mean_variance()**0.5
+
+    def settled(self, player1, player2, target_width):
+        '''
+        Returns True if the pairing has been played at least SETTLED_COUNT
+        times and both players' confidence intervals in it are narrower
+        than target_width.
+        '''
+        if self.stats[player1][player2].count < SETTLED_COUNT:
+            return False
+        for first, second in ((player1, player2), (player2, player1)):
+            half_width = self.half_width(first, second)
+            if half_width is None or 2*half_width >= target_width:
+                return False
+        return True
+
+    @property
+    def result_table(self):
+        return [[stats.mean if stats is not None else 0 for stats in row]
+                for row in self.stats]
+
+    @property
+    def scores(self):
+        return [sum(stats.mean for stats in row if stats is not None)
+                for row in self.stats]
+
+    def score_half_width(self, player):
+        '''
+        Returns half the width of the confidence interval of scores[player],
+        taking the pairings as independent, with Student's t for the
+        pairing played the fewest times.
+        '''
+        played = [stats for stats in self.stats[player] if stats is not None]
+        if not played:
+            return 0.0
+        fewest = min(stats.count for stats in played)
+        if fewest < 2:
+            return None
+        variance = sum(stats.mean_variance() for stats in played)
+        return confidence_t(fewest - 1)*variance**0.5
+
+def play_repeated_tournament(num_players, repetitions, seed=None,
+                             target_width=None, payoff=None, workers=None,
+                             cache=None):
+    '''
+    Plays the tournament repetitions times, each time with different random
+    streams from match_rng() (repetition 0 is the tournament
+    play_tournament() plays with the same seed), and returns the
+    RepeatedResults.
+    With target_width, a pairing is not played again once it has been
+    played SETTLED_COUNT times and the confidence intervals of both
+    players' mean scores per round against each other are narrower than
+    that.
+    payoff, workers and cache are as for play_tournament().
+    '''
+    if seed is None:
+        seed = random.getrandbits(32)
+    results = RepeatedResults(num_players)
+    pairs = tournament_pairs(num_players)
+    for repetition in range(repetitions):
+        if target_width is not None:
+            pairs = [(player1, player2) for player1, player2 in pairs
+                     if not results.settled(player1, player2, target_width)]
+            if not pairs:
+                break
+        jobs = [(player1, player2, seed, repetition, payoff)
+                for player1, player2 in pairs]
+        for result in play_pairs(jobs, workers, cache):
+            results.add_match(*result)
+    return results
+
+def print_repeated_results(results):
+    '''Prints each player's mean score with its confidence interval.'''
+    num_players = results.num_players
+    scores = results.scores
+    print('\n\n\n Average per round over the repetitions, with 95% '
+          'confidence intervals and team strategy names:\n\n')
+    for player in range(num_players):
+        half_width = results.score_half_width(player)
+        if half_width is None:
+            # a pairing has been played only once
+            interval = '%.2f +/- ?' % (scores[player]/num_players)
         else:
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-<<<<<<< HEAD
-            else:
-                return 'c' #otherwise collude
-=======
-            elif history[-1]=='b' and opponent_history[-1]=='b':
-                return 'c' # collude if they were punished last time
-            elif history[-1]=='b' and opponent_history[-1]=='c':
-                return 'c' # collude if they were set free
-            else:
-                return 'c' #otherwise collude
+            interval = '%.2f +/- %.2f' % (scores[player]/num_players,
+                                          half_width/num_players)
+        print('player ' + str(player), ': ', interval,
+              ' points: ', results.team_names[player])
 
->>>>>>> origin/master
-            
-    elif player == 20:
-        if getting_team_name:
-            return 'loyal vengeful'
+def top_k_status(bounds, k):
+    '''
+    bounds[player] is a 2-tuple (lowest, highest) of the scores player can
+    still end up with. Returns a list with, for each player, True if it is
+    certain to be in the top k, False if it is certain not to be, and None
+    if that is not known yet.
+    '''
+    status = []
+    for player, (lowest, highest) in enumerate(bounds):
+        # players who might still finish level with or ahead of player
+        rivals = sum(1 for other, (other_lowest, other_highest)
+                     in enumerate(bounds)
+                     if other != player and other_highest >= lowest)
+        # players certain to finish ahead of player
+        ahead = sum(1 for other, (other_lowest, other_highest)
+                    in enumerate(bounds)
+                    if other != player and other_lowest > highest)
+        if rivals < k:
+            status.append(True)
+        elif ahead >= k:
+            status.append(False)
         else:
-            if len(opponent_history)==0: #It's the first round: collude
-                return 'c'
-            elif history[-1]=='c' and opponent_history[-1]=='b':
-                return 'b' # betray is they were severely punished last time
-            else:
-                return 'c' #otherwise collude
+            status.append(None)
+    return status
 
-<<<<<<< HEAD
-=======
-
->>>>>>> origin/master
-    
+def possible_moves(player):
+    '''
+    Returns the moves player can make: for a strategy played from a
+    MemoryOne table or MemoryTable, only the moves in its table, and
+    otherwise any move, an invalid one included.
+    '''
+    table = memory_one_table(player)
+    if table is not None:
+        return set([table.opening]) | set(table.responses.values())
+    table = memory_table(player)
+    if table is not None:
+        return set('cb'[move] for move in table.moves)
+    return set(MOVES)
+
+def play_top_k(num_players, k, seed=None, payoff=None, workers=None,
+               cache=None, batch=None):
+    '''
+    Plays only as much of the tournament as it takes to know which k
+    players have the highest scores.
+    Every match scores each player between the lowest and highest points
+    per round the payoff matrix allows for the moves the two players can
+    make (see possible_moves()), so the matches not played yet bound each
+    player's final score. Matches are played batch at a time (by default
+    num_players), those that can narrow the most the bounds of unsettled
+    players whose bounds reach the edge of the top k first, and play stops
+    once every player is known to be in or out of the top k. Matches
+    between two settled players are never played, since they cannot change
+    the top k, unless one of them could still finish level with an
+    unsettled player.
+    Players who finish exactly level at the k-th place can never be
+    settled; they all go in top, so top then has more than k players.
+    seed, payoff, workers and cache are as for play_tournament(); a match
+    that is played is the same as in the full tournament.
+    Returns 3-tuple (top, skipped, tournament): the top k players, highest
+    known score first, followed by any others tied with the last of them;
+    the (player1, player2) pairs that were not played; and the
+    TournamentResults of the matches that were, in which the skipped
+    pairs' result_table entries are not filled in.
+    '''
+    if seed is None:
+        seed = random.getrandbits(32)
+    if payoff is None:
+        payoff = DEFAULT_PAYOFF
+    if batch is None:
+        batch = num_players
+    moves = [possible_moves(player) for player in range(num_players)]
+    # each match's bounds on the score per round of player1, then player2
+    match_bounds = {}
+    for player1, player2 in tournament_pairs(num_players):
+        match_bounds[(player1, player2)] = (
+            payoff.round_bounds(moves[player1], moves[player2]),
+            payoff.round_bounds(moves[player2], moves[player1]))
+    tournament = TournamentResults(num_players, keep_moves=False)
+    unplayed = tournament_pairs(num_players)
+    def score_bounds():
+        bounds = [[score, score] for score in tournament.scores]
+        for pair in unplayed:
+            for player, (lowest, highest) in zip(pair, match_bounds[pair]):
+                bounds[player][0] += lowest
+                bounds[player][1] += highest
+        return bounds
+    while unplayed:
+        bounds = score_bounds()
+        status = top_k_status(bounds, k)
+        # a match only matters if it can move an unsettled player
+        matters = [known is None for known in status]
+        unsettled = [pair for pair in unplayed
+                     if matters[pair[0]] or matters[pair[1]]]
+        if not unsettled:
+            # the unsettled players' scores are final, but a settled player
+            # who could still finish level with one of them decides whether
+            # it is in
+            undecided = [bounds[player] for player in range(num_players)
+                         if status[player] is None]
+            matters = [any(lowest <= other_highest and other_lowest <= highest
+                           for other_lowest, other_highest in undecided)
+                       for lowest, highest in bounds]
+            unsettled = [pair for pair in unplayed
+                         if matters[pair[0]] or matters[pair[1]]]
+        if not unsettled:
+            break
+        # the scores between which the top k is decided: from the k-th
+        # highest lowest bound to the (k+1)-th highest highest bound
+        lows = sorted((lowest for lowest, highest in bounds), reverse=True)
+        highs = sorted((highest for lowest, highest in bounds), reverse=True)
+        edge = [lows[k - 1], highs[min(k, num_players - 1)]]
+        edge.sort()
+        # how far each player's bounds reach into those scores
+        overlaps = [max(0, min(highest, edge[1]) - max(lowest, edge[0])) + 1
+                    for lowest, highest in bounds]
+        # play first the matches that can narrow the bounds of unsettled
+        # players near the edge the most
+        def overlap(pair):
+            return sum(overlaps[player]*(highest - lowest)
+                       for player, (lowest, highest)
+                       in zip(pair, match_bounds[pair])
+                       if matters[player])
+        unsettled.sort(key=overlap, reverse=True)
+        chosen = set(unsettled[:batch])
+        jobs = [(player1, player2, seed, 0, payoff)
+                for player1, player2 in unplayed if (player1, player2) in chosen]
+        unplayed = [pair for pair in unplayed if pair not in chosen]
+        for result in play_pairs(jobs, workers, cache):
+            tournament.add_match(*result)
+    # whoever is still unsettled now has finished exactly level with others
+    # across the k-th place, and their scores are final; they go after the
+    # settled top players, whose scores may not be
+    status = top_k_status(score_bounds(), k)
+    top = sorted((player for player in range(num_players)
+                  if status[player] is not False),
+                 key=lambda player: (status[player] is None,
+                                     -tournament.scores[player]))
+    return (top, unplayed, tournament)
+
+class Evolution(object):
+    '''
+    Population dynamics on top of the matches: each strategy in players is
+    a kind of individual, and how well it does is its expected score per
+    round against the population.
+    matrix[i, j] is the expected score per round of players[i] against
+    players[j], diagonal included, as a NumPy array. It is worked out once,
+    when the Evolution is made: a match between two deterministic
+    strategies is played once, and any other is played repeats times with
+    different random streams and averaged. add_player() plays only the new
+    strategy's matches, so a mutant can enter without playing everything
+    again.
+    seed, payoff, workers and cache are as for play_tournament().
+    '''
+    def __init__(self, players, seed=None, repeats=10, payoff=None,
+                 workers=None, cache=None):
+        import numpy
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        self.repeats = repeats
+        self.payoff = payoff
+        self.workers = workers
+        self.cache = cache
+        self.players = []
+        self.matrix = numpy.zeros((0, 0))
+        for player in players:
+            self.add_player(player)
+
+    def expected_scores(self, player, opponents):
+        '''
+        Returns 2-tuple of lists (scores, opponent_scores): the expected
+        score per round of player against each of opponents, and of each
+        opponent against player.
+        '''
+        jobs = []
+        for opponent in opponents:
+            repeats = self.repeats
+            if is_deterministic(player) and is_deterministic(opponent):
+                repeats = 1
+            # higher number first, as in tournament_pairs(), so repetition 0
+            # is the very match the tournament plays
+            player1, player2 = max(player, opponent), min(player, opponent)
+            jobs.extend((player1, player2, self.seed, repetition, self.payoff)
+                        for repetition in range(repeats))
+        totals = {}
+        for (player1, player2, moves1, moves2, score1, score2,
+             fast_forwarded) in play_pairs(jobs, self.workers, self.cache):
+            if player1 != player:
+                player2, score1, score2 = player1, score2, score1
+            total = totals.setdefault(player2, [0.0, 0.0, 0])
+            total[0] += score1*1.0/len(moves1)
+            total[1] += score2*1.0/len(moves2)
+            total[2] += 1
+        scores = [totals[opponent][0]/totals[opponent][2]
+                  for opponent in opponents]
+        opponent_scores = [totals[opponent][1]/totals[opponent][2]
+                           for opponent in opponents]
+        return (scores, opponent_scores)
+
+    def add_player(self, player):
+        '''
+        Adds the strategy player (a mutant) to players, playing it against
+        every strategy already there and against itself. Returns its index
+        in players and matrix.
+        '''
+        import numpy
+        scores, opponent_scores = self.expected_scores(
+            player, self.players + [player])
+        size = len(self.players)
+        matrix = numpy.zeros((size + 1, size + 1))
+        matrix[:size, :size] = self.matrix
+        matrix[size, :] = scores
+        matrix[:size, size] = opponent_scores[:size]
+        # both sides of a match against itself are the same strategy
+        matrix[size, size] = (scores[size] + opponent_scores[size])/2.0
+        self.players.append(player)
+        self.matrix = matrix
+        return size
+
+    def fitness_matrix(self):
+        '''
+        Returns matrix shifted so that every entry is at least 1: the
+        scores are mostly negative, and fitness has to be positive.
+        '''
+        return self.matrix - self.matrix.min() + 1.0
+
+    def replicator(self, shares, generations):
+        '''
+        Runs discrete replicator dynamics: each generation a strategy's
+        share of the population grows in proportion to its fitness against
+        the current population.
+        shares is the starting share of each of players.
+        Returns a (generations + 1) x len(players) NumPy array of the
+        shares in each generation, starting with shares.
+        '''
+        import numpy
+        fitness = self.fitness_matrix()
+        history = numpy.empty((generations + 1, len(self.players)))
+        share = numpy.asarray(shares, dtype=numpy.float64)
+        share = share/share.sum()
+        history[0] = share
+        for generation in range(1, generations + 1):
+            share = share*fitness.dot(share)
+            share /= share.sum()
+            history[generation] = share
+        return history
+
+    def moran(self, counts, generations, seed=None):
+        '''
+        Runs a Moran process on a population of fixed size: each
+        generation one individual, chosen in proportion to its fitness
+        against the rest of the population, has an offspring that replaces
+        one individual chosen at random.
+        counts is the starting number of individuals of each of players;
+        there must be one for each, none negative, and at least 2 in all,
+        or ValueError is raised.
+        Returns a (generations + 1) x len(players) NumPy array of the
+        counts in each generation, starting with counts.
+        '''
+        import numpy
+        counts = list(counts)
+        if len(counts) != len(self.players):
+            raise ValueError('need a count for each of the %d players, got %d'
+                             % (len(self.players), len(counts)))
+        if any(count < 0 for count in counts):
+            raise ValueError('counts cannot be negative, got %r' % (counts,))
+        if sum(counts) < 2:
+            raise ValueError('the population needs at least 2 individuals, '
+                             'got %d' % sum(counts))
+        rng = numpy.random.RandomState(seed)
+        fitness = self.fitness_matrix()
+        self_fitness = numpy.diag(fitness)
+        count = numpy.array(counts, dtype=numpy.int64)
+        population = count.sum()
+        history = numpy.empty((generations + 1, len(self.players)),
+                              dtype=numpy.int64)
+        history[0] = count
+        # draw all the random numbers at once
+        births = rng.random_sample(generations)
+        deaths = rng.random_sample(generations)
+        for generation in range(1, generations + 1):
+            # nobody plays against themselves
+            individual = (fitness.dot(count) - self_fitness)/(population - 1)
+            weight = numpy.cumsum(individual*count)
+            parent = numpy.searchsorted(weight, births[generation-1]*weight[-1],
+                                        side='right')
+            dead = numpy.searchsorted(numpy.cumsum(count),
+                                      deaths[generation-1]*population,
+                                      side='right')
+            count[parent] += 1
+            count[dead] -= 1
+            history[generation] = count
+        return history
+
+def export_results(tournament, filename):
+    '''
+    Writes a TournamentResults to filename in one go, as columns that
+    dashboards can load without parsing tournament.txt.
+    If filename ends in .parquet it is written with pyarrow, one row per
+    player and opponent: player, opponent, score_per_round, rounds and
+    cooperation_rate, with team_names and scores kept as JSON in the
+    file's metadata.
+    Otherwise it is a NumPy .npz file of the arrays result_table, scores,
+    team_names, rounds_table and cooperation_table, laid out as in
+    TournamentResults.
+    '''
+    import numpy
+    num_players = tournament.num_players
+    result_table = numpy.array(tournament.result_table, dtype=numpy.float64)
+    rounds_table = numpy.array(tournament.rounds_table, dtype=numpy.int64)
+    cooperation_table = numpy.array(tournament.cooperation_table,
+                                    dtype=numpy.float64)
+    if filename.endswith('.parquet'):
+        import pyarrow
+        import pyarrow.parquet
+        player, opponent = numpy.nonzero(~numpy.eye(num_players, dtype=bool))
+        table = pyarrow.table({
+            'player': player.astype(numpy.int32),
+            'opponent': opponent.astype(numpy.int32),
+            'score_per_round': result_table[player, opponent],
+            'rounds': rounds_table[player, opponent],
+            'cooperation_rate': cooperation_table[player, opponent]})
+        table = table.replace_schema_metadata({
+            'team_names': json.dumps(tournament.team_names),
+            'scores': json.dumps(tournament.scores)})
+        pyarrow.parquet.write_table(table, filename)
+    else:
+        with open(filename, 'wb') as output:
+            numpy.savez(output, result_table=result_table,
+                        scores=numpy.array(tournament.scores,
+                                           dtype=numpy.float64),
+                        team_names=numpy.array(tournament.team_names),
+                        rounds_table=rounds_table,
+                        cooperation_table=cooperation_table)
+
+def tournament_filename():
+    '''Returns the path of tournament.txt, next to this python script.'''
+    # use the same directory as the python script
+    import os.path              
+    directory = os.path.dirname(os.path.abspath(__file__))  
     
+    #name the file tournament.txt
+    return os.path.join(directory, 'tournament.txt')
 
-
-
-
-
-
-
-def play_tournament(num_players):
-    #create a list of zeros, one per player
-    scores = []
-    for i in range(num_players):
-        scores += [0]
-    
-    
-    ''' Get the team name from each team algorithm'''
-    #create a list of the right length
-    team_names = range(num_players)
-    for player in range(num_players):
-        team_names[player] = get_action(player,'','',0,0,getting_team_name=True)
-             
-    # each element will become a column for each player
-    # range is just to get list of correct size
-    result_table=range(num_players)     
-    moves_table=range(num_players) 
-    
-    
-    for player1 in range(num_players):  
-        # create the column for each player
-        # range just to get list of correct size
-        result_table[player1]=range(num_players) 
-        result_table[player1][player1]=0 # initialize unused diagonal to 0
-        moves_table[player1]=range(num_players)
-        # play a game between with every other player of lower number
-        for player2 in range(player1):
-            moves1, moves2, score1, score2 = \
-                play_iterative_rounds(player1, player2)
-            
-            rounds = len(moves1)
-            score1_per_round = score1/rounds 
-            score2_per_round = score2/rounds
-            
-            result_table[player1][player2]=score1_per_round
-            result_table[player2][player1]=score2_per_round
-            
-            moves_table[player1][player2] = moves1
-            moves_table[player2][player1] = moves2
-            
-            #accumulate the results for the two players
-            scores[player1] += score1*1.0/len(moves1)#ends up same as column sum
-            scores[player2] += score2*1.0/len(moves2)#ends up same as column sum
-     
-    '''report round-level results in a data file'''
-    use_datafile=True
-    if use_datafile:
-        # use the same directory as the python script
-        import os.path              
-        directory = os.path.dirname(os.path.abspath(__file__))  
-        
-        #name the file tournament.txt
-        filename = os.path.join(directory, 'tournament.txt')
+class TournamentReport(object):
+    '''
+    Writes tournament.txt while the tournament is being played: each
+    pair's block is written as soon as write_match() is given the match,
+    so the moves never have to be kept in memory, and write_summary()
+    adds the tables and the code at the end.
+    Matches must be written in tournament_pairs() order. play_pairs()
+    yields them in that order even when they are played in parallel,
+    holding back any that finish early.
+    '''
+    def __init__(self, filename):
         #create the file for the round-by-round results
-        results = open(filename,'w')
-        for player1 in range(num_players):
-            for player2 in range(player1):
-                # store the results in the file
-                #title by team numbers
-                results.write('team ' + str(player1) + 
-                              ' vs. ' + 'team ' + str(player2) +'\n')
-                #title by player-on-player average score
-                results.write(str(result_table[player1][player2]) + 
-                              ' vs. ' + str(result_table[player2][player1])+'\n')
-                #title by team names
-                results.write(team_names[player1] + 
-                             ' vs. ' + team_names[player2] + '\n')
-                #show the moves, aligned vertically
-                results.write(moves_table[player1][player2] +'\n')
-                results.write(moves_table[player2][player1] +'\n')
-                #blank line between each pair's results
-                results.write('\n')
-            
+        self.results = open(filename,'w')
+
+    def write_match(self, tournament, player1, player2, moves1, moves2):
+        results = self.results
+        result_table = tournament.result_table
+        team_names = tournament.team_names
+        fast_forwards = tournament.fast_forwards
+        # store the results in the file
+        #title by team numbers
+        results.write('team ' + str(player1) + 
+                      ' vs. ' + 'team ' + str(player2))
+        #note matches whose last rounds were worked out, not played
+        if (player1, player2) in fast_forwards:
+            results.write(' (fast-forwarded after round ' +
+                          str(fast_forwards[(player1, player2)]) + ')')
+        results.write('\n')
+        #title by player-on-player average score
+        results.write(str(result_table[player1][player2]) + 
+                      ' vs. ' + str(result_table[player2][player1])+'\n')
+        #title by team names
+        results.write(team_names[player1] + 
+                     ' vs. ' + team_names[player2] + '\n')
+        #show the moves, aligned vertically
+        results.write(str(moves1) +'\n')
+        results.write(str(moves2) +'\n')
+        #blank line between each pair's results
+        results.write('\n')
+
+    def write_summary(self, tournament):
+        '''Writes the tables and the code at the end, and closes the file.'''
+        results = self.results
+        num_players = tournament.num_players
+        result_table = tournament.result_table
+        scores = tournament.scores
+        team_names = tournament.team_names
         #at the bottom repeat the output that was sent to the screen
         #print a title for the table
         results.write('\n\n\n\tEach column shows score earned per round against each other player.\n\n\n')
@@ -934,6 +2833,432 @@ def play_tournament(num_players):
         this_code_file = open(__file__, 'r')
         for line in this_code_file:
             results.write(line)
+        this_code_file.close()
+        results.close()
+
+def pack_bits(bits):
+    '''
+    Packs a string of '0's and '1's into bytes, the first character into
+    the lowest bit of the first byte.
+    '''
+    size = (len(bits) + 7) // 8
+    if size == 0:
+        return b''
+    number = int(bits[::-1], 2)
+    return binascii.unhexlify('%0*x' % (size*2, number))[::-1]
+
+def unpack_bits(packed, length):
+    '''Undoes pack_bits(), giving back length characters.'''
+    if length == 0:
+        return ''
+    number = int(binascii.hexlify(packed[::-1]), 16)
+    return bin(number)[2:].zfill(length)[::-1]
+
+def encode_name(name):
+    if isinstance(name, bytes):
+        return name
+    return name.encode('utf-8')
+
+class BinaryReport(object):
+    '''
+    Writes a tournament's results in a compact binary file alongside
+    tournament.txt, which BinaryResults can read back a piece at a time.
+    The file is, with all numbers little-endian:
+    header: HEADER - magic, version, number of players, number of pairs,
+        length of the team names
+    team names: UTF-8, one per line
+    index: one ENTRY per pair in tournament_pairs() order - player1,
+        player2, rounds, flags, fast_forwarded (0 if not), score1, score2,
+        and the file offset of the pair's moves
+    moves: for each pair, player1's then player2's moves one bit per round,
+        1 for 'b', packed with pack_bits(); if the pair's flags have
+        INVALID set, then two more such bit strings marking the rounds
+        in which each player's move was invalid
+    Matches must be written in tournament_pairs() order, like
+    TournamentReport. Scores are stored as integers, so the payoffs must be
+    integers too; see check_payoff().
+    '''
+    MAGIC = b'PDT1'
+    VERSION = 1
+    HEADER = struct.Struct('<4sIIII')
+    ENTRY = struct.Struct('<IIIIIqqQ')
+    # flags
+    PLAYED = 1
+    INVALID = 2
+
+    @staticmethod
+    def check_payoff(payoff):
+        '''
+        Raises ValueError unless every payoff in payoff, a PayoffMatrix (or
+        None for DEFAULT_PAYOFF), is an integer, so the scores fit the file.
+        '''
+        if payoff is None:
+            payoff = DEFAULT_PAYOFF
+        if not all(isinstance(value, numbers.Integral)
+                   for value in payoff.values()):
+            raise ValueError('the binary results file needs integer '
+                             'payoffs, got %r' % (payoff,))
+
+    def __init__(self, filename, team_names):
+        self.file = open(filename, 'wb')
+        names = b'\n'.join(encode_name(name) for name in team_names)
+        num_players = len(team_names)
+        self.num_pairs = num_players*(num_players - 1)//2
+        self.file.write(self.HEADER.pack(self.MAGIC, self.VERSION,
+                                         num_players, self.num_pairs,
+                                         len(names)))
+        self.file.write(names)
+        self.index_start = self.file.tell()
+        # the index is filled in at the end; leave room for it now
+        self.entries = [self.ENTRY.pack(0, 0, 0, 0, 0, 0, 0, 0)]*self.num_pairs
+        self.file.write(b''.join(self.entries))
+        self.next_pair = 0
+
+    def write_match(self, player1, player2, moves1, moves2, score1, score2,
+                    fast_forwarded=None):
+        moves1 = str(moves1)
+        moves2 = str(moves2)
+        flags = self.PLAYED
+        blocks = [pack_bits(moves1.replace('c', '0').replace('b', '1')
+                            .replace(' ', '0')),
+                  pack_bits(moves2.replace('c', '0').replace('b', '1')
+                            .replace(' ', '0'))]
+        if ' ' in moves1 or ' ' in moves2:
+            flags |= self.INVALID
+            for moves in (moves1, moves2):
+                blocks.append(pack_bits(moves.replace('c', '0')
+                                        .replace('b', '0')
+                                        .replace(' ', '1')))
+        offset = self.file.tell()
+        self.file.write(b''.join(blocks))
+        self.entries[self.next_pair] = self.ENTRY.pack(
+            player1, player2, len(moves1), flags, fast_forwarded or 0,
+            score1, score2, offset)
+        self.next_pair += 1
+
+    def close(self):
+        self.file.seek(self.index_start)
+        self.file.write(b''.join(self.entries))
+        self.file.close()
+
+class BinaryResults(object):
+    '''
+    Reads a file written by BinaryReport. The file is memory-mapped, so
+    looking up one pair's moves or the score matrix only reads those parts
+    of the file.
+    team_names[player] is each player's team name.
+    '''
+    def __init__(self, filename):
+        import mmap
+        self.file = open(filename, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.num_players, self.num_pairs, names_length = \
+            BinaryReport.HEADER.unpack_from(self.map, 0)
+        if magic != BinaryReport.MAGIC or version != BinaryReport.VERSION:
+            raise ValueError('%s is not a tournament results file' % filename)
+        names_start = BinaryReport.HEADER.size
+        names = self.map[names_start:names_start + names_length]
+        self.team_names = [str(name.decode('utf-8'))
+                           for name in names.split(b'\n')]
+        self.index_start = names_start + names_length
+
+    def entry(self, player1, player2):
+        '''Returns the unpacked index ENTRY of the pair player1, player2.'''
+        if player1 == player2:
+            raise ValueError('player %d does not play itself' % player1)
+        high, low = max(player1, player2), min(player1, player2)
+        pair = high*(high - 1)//2 + low
+        entry = BinaryReport.ENTRY.unpack_from(
+            self.map, self.index_start + pair*BinaryReport.ENTRY.size)
+        if not entry[3] & BinaryReport.PLAYED:
+            raise KeyError('no match between %d and %d' % (player1, player2))
+        return entry
+
+    def match(self, player1, player2):
+        '''
+        Returns 4-tuple (rounds, score1, score2, fast_forwarded) for the
+        match between player1 and player2, scores from player1's side.
+        fast_forwarded is None if the match was not.
+        '''
+        (first, second, rounds, flags, fast_forwarded, score1, score2,
+         offset) = self.entry(player1, player2)
+        if player1 != first:
+            score1, score2 = score2, score1
+        return (rounds, score1, score2, fast_forwarded or None)
+
+    def moves(self, player1, player2):
+        '''
+        Returns 2-tuple of strings (moves1, moves2): player1's and
+        player2's moves in their match.
+        '''
+        (first, second, rounds, flags, fast_forwarded, score1, score2,
+         offset) = self.entry(player1, player2)
+        size = (rounds + 7)//8
+        blocks = 4 if flags & BinaryReport.INVALID else 2
+        blocks = [self.map[offset + block*size:offset + (block + 1)*size]
+                  for block in range(blocks)]
+        moves = []
+        for block in range(2):
+            played = unpack_bits(blocks[block], rounds)
+            played = played.replace('0', 'c').replace('1', 'b')
+            if len(blocks) == 4:
+                invalid = unpack_bits(blocks[block + 2], rounds)
+                played = ''.join(' ' if bad == '1' else move
+                                 for move, bad in zip(played, invalid))
+            moves.append(played)
+        if player1 == first:
+            return (moves[0], moves[1])
+        return (moves[1], moves[0])
+
+    def score_matrix(self):
+        '''
+        Returns the result_table of the tournament, read from the index
+        alone: result_table[player1][player2] is player1's score per round
+        against player2.
+        '''
+        result_table = [[0]*self.num_players for player in
+                        range(self.num_players)]
+        for pair in range(self.num_pairs):
+            (player1, player2, rounds, flags, fast_forwarded, score1, score2,
+             offset) = BinaryReport.ENTRY.unpack_from(
+                self.map, self.index_start + pair*BinaryReport.ENTRY.size)
+            if flags & BinaryReport.PLAYED and rounds:
+                result_table[player1][player2] = score1*1.0/rounds
+                result_table[player2][player1] = score2*1.0/rounds
+        return result_table
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+# the version of the partial result files play_shard() writes
+PARTIAL_VERSION = 1
+
+def shard_of(seed, pair, shards):
+    '''
+    Returns which of shards shards the pair with index pair (in
+    tournament_pairs() order) belongs to. It depends only on the seed and
+    the pair, so every machine works out the same split, and hashing
+    spreads the slow pairings evenly over the shards.
+    '''
+    key = '%d:%d' % (seed, pair)
+    return int(hashlib.sha256(key.encode('ascii')).hexdigest()[:16], 16) % \
+        shards
+
+def partial_header(num_players, seed, payoff, shards, shard):
+    '''
+    Returns the first line of a partial result file, as a dict: what the
+    matches were played with, so merge_shards() can check the files belong
+    together.
+    '''
+    if payoff is None:
+        payoff = DEFAULT_PAYOFF
+    return {'version': PARTIAL_VERSION,
+            'num_players': num_players,
+            'seed': seed,
+            'payoff': list(payoff.values()),
+            'rounds': list(ROUNDS),
+            'strategies': [strategy_hash(player)
+                           for player in range(num_players)],
+            'shards': shards,
+            'shard': shard}
+
+def write_partial_match(output, pair, result):
+    '''Writes one play_pair() result as a line of a partial result file.'''
+    player1, player2, moves1, moves2, score1, score2, fast_forwarded = result
+    output.write(json.dumps({'pair': pair,
+                             'player1': player1, 'player2': player2,
+                             'moves1': str(moves1), 'moves2': str(moves2),
+                             'score1': score1, 'score2': score2,
+                             'fast_forwarded': fast_forwarded}) + '\n')
+
+def read_partial_match(partial, offset):
+    '''
+    Returns the play_pair() result on the line at offset in partial, a
+    partial result file opened in binary mode, as read_partial() found it.
+    '''
+    partial.seek(offset)
+    match = json.loads(partial.readline().decode('utf-8'))
+    return (match['player1'], match['player2'],
+            History(str(match['moves1'])), History(str(match['moves2'])),
+            match['score1'], match['score2'], match['fast_forwarded'])
+
+def read_partial(filename):
+    '''
+    Returns 3-tuple (header, offsets, length) from a partial result file:
+    the header dict, a dict from pair index to where that match's line
+    starts in the file, for read_partial_match(), and the length of the
+    file up to the end of the last whole line. A last line cut short, as
+    by a machine going down, is left out.
+    Only the offsets are kept, not the moves, so a file of any size can be
+    read back a match at a time.
+    '''
+    offsets = {}
+    with open(filename, 'rb') as partial:
+        line = partial.readline()
+        try:
+            header = json.loads(line.decode('utf-8'))
+        except ValueError:
+            header = None
+        if not isinstance(header, dict) or \
+                header.get('version') != PARTIAL_VERSION:
+            raise ValueError('%s is not a partial result file' % filename)
+        length = len(line)
+        for line in partial:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                match = json.loads(line.decode('utf-8'))
+            except ValueError:
+                break
+            offsets[match['pair']] = length
+            length += len(line)
+    return (header, offsets, length)
+
+def play_shard(num_players, shards, shard, seed, filename, payoff=None,
+               workers=None, cache=None):
+    '''
+    Plays shard number shard (from 0) of a tournament split into shards
+    shards, and writes its matches to a partial result file, filename, for
+    merge_shards(). Every machine must be given the same num_players,
+    shards, seed and payoff; workers and cache are as for
+    play_tournament().
+    The file is JSON, one object per line: partial_header() and then one
+    line per match, written as each match finishes.
+    '''
+    pairs = tournament_pairs(num_players)
+    indexes = [pair for pair in range(len(pairs))
+               if shard_of(seed, pair, shards) == shard]
+    jobs = [pairs[pair] + (seed, 0, payoff) for pair in indexes]
+    with open(filename, 'w') as output:
+        output.write(json.dumps(partial_header(num_players, seed, payoff,
+                                               shards, shard)) + '\n')
+        for pair, result in zip(indexes, play_pairs(jobs, workers, cache)):
+            write_partial_match(output, pair, result)
+
+# how often play_checkpointed() makes sure the checkpoint is on disk
+CHECKPOINT_SECONDS = 10
+
+def play_checkpointed(jobs, play, filename, header, workers=None,
+                      cache=None):
+    '''
+    Yields the same as play(jobs, workers, cache), which is play_pairs() or
+    play_batched_pairs(), for jobs of the whole tournament in
+    tournament_pairs() order, while keeping a checkpoint in filename: a
+    partial result file (see play_shard()) with header, to which each
+    match is added as it finishes, and which is flushed to disk at least
+    every CHECKPOINT_SECONDS.
+    If filename already holds a checkpoint of the same tournament, the
+    matches in it are not played again, just yielded in their turn; a last
+    line cut short is dropped. Since each match's random stream comes
+    from match_rng(), the seed in the header and the pair's place are all
+    that is needed to play the rest exactly as before.
+    '''
+    import os
+    done = {}
+    finished = None
+    if os.path.exists(filename):
+        file_header, done, length = read_partial(filename)
+        if file_header != header:
+            raise ValueError('%s is a checkpoint of a different tournament'
+                             % filename)
+        output = open(filename, 'r+')
+        output.seek(length)
+        output.truncate()
+        # the matches already done are read back one at a time, in turn
+        finished = open(filename, 'rb')
+    else:
+        output = open(filename, 'w')
+        output.write(json.dumps(header) + '\n')
+    try:
+        played = play([job for pair, job in enumerate(jobs)
+                       if pair not in done], workers, cache)
+        saved = timer()
+        for pair in range(len(jobs)):
+            if pair in done:
+                yield read_partial_match(finished, done[pair])
+                continue
+            result = next(played)
+            write_partial_match(output, pair, result)
+            if timer() - saved >= CHECKPOINT_SECONDS:
+                output.flush()
+                os.fsync(output.fileno())
+                saved = timer()
+            yield result
+    finally:
+        output.close()
+        if finished is not None:
+            finished.close()
+
+def checkpoint_seed(filename):
+    '''Returns the seed in a checkpoint file, or None if there is none.'''
+    import os
+    if not os.path.exists(filename):
+        return None
+    return read_partial(filename)[0]['seed']
+
+def merge_shards(filenames, report_filename=None):
+    '''
+    Combines the partial result files of every shard of a tournament into
+    the tournament.txt (or report_filename) that playing the whole
+    tournament on one machine writes, and returns the TournamentResults.
+    Raises ValueError if the files do not belong to the same tournament,
+    were played with different strategy code from this file's, or leave
+    matches out.
+    '''
+    header = None
+    # pair index to 2-tuple (which file, offset in it)
+    matches = {}
+    shards_seen = set()
+    for index, filename in enumerate(filenames):
+        file_header, offsets, length = read_partial(filename)
+        shard = file_header.pop('shard')
+        if header is None:
+            header = file_header
+        elif file_header != header:
+            raise ValueError('%s is from a different tournament' % filename)
+        shards_seen.add(shard)
+        for pair, offset in offsets.items():
+            matches[pair] = (index, offset)
+    if header is None:
+        raise ValueError('no partial result files to merge')
+    num_players = header['num_players']
+    if header['strategies'] != [strategy_hash(player)
+                                for player in range(num_players)]:
+        raise ValueError('the shards were played with different strategy '
+                         'code')
+    missing = set(range(header['shards'])) - shards_seen
+    if missing:
+        raise ValueError('shards %s are missing' %
+                         ', '.join(str(shard) for shard in sorted(missing)))
+    pairs = tournament_pairs(num_players)
+    if len(matches) != len(pairs):
+        raise ValueError('%d of %d matches are missing' %
+                         (len(pairs) - len(matches), len(pairs)))
+    tournament = TournamentResults(num_players, keep_moves=False)
+    if report_filename is None:
+        report_filename = tournament_filename()
+    report = TournamentReport(report_filename)
+    # each match is read back from its shard only when its turn comes
+    partials = [open(filename, 'rb') for filename in filenames]
+    try:
+        for pair in range(len(pairs)):
+            index, offset = matches[pair]
+            result = read_partial_match(partials[index], offset)
+            tournament.add_match(*result)
+            report.write_match(tournament, *result[:4])
+    finally:
+        for partial in partials:
+            partial.close()
+    report.write_summary(tournament)
+    return tournament
+
+def print_results(tournament):
+    '''Reports a TournamentResults on screen, as play_tournament() does.'''
+    num_players = tournament.num_players
+    team_names = tournament.team_names
+    scores = tournament.scores
+    result_table = tournament.result_table
                 
     '''report the results on screen'''        
     #print a title for the table
@@ -963,4 +3288,191 @@ def play_tournament(num_players):
         print('player ' + str(player) , ': ' , 
                str(int(scores[player])/num_players) , ' points: ',
                team_names[player])
+
+def play_tournament(num_players, workers=None, seed=None, payoff=None,
+                    cache=None, binary_filename=None, export_filename=None,
+                    repetitions=None, target_width=None, top_k=None,
+                    profile=None, call_budget=None, match_budget=None,
+                    batched=False, checkpoint=None):
+    '''
+    Plays every player against every other player and reports the results
+    on screen and in tournament.txt.
+    workers is the number of processes to play the matches in.
+    seed makes the tournament reproducible: each match gets its own random
+    stream from match_rng(), so the output does not depend on workers or on
+    the order the matches are played in. Without a seed one is drawn from
+    the random module.
+    payoff is the PayoffMatrix to score the rounds with.
+    cache is a MatchCache, or the name of its file, that keeps matches from
+    one run to the next: with the same seed, only matches involving a
+    strategy whose code changed are played again.
+    binary_filename, if given, is where to also write the results in the
+    compact binary form that BinaryResults reads.
+    export_filename, if given, is where export_results() writes the tables
+    once the tournament is over.
+    repetitions, if given, plays the tournament that many times with
+    play_repeated_tournament(), stopping early for each pairing once its
+    confidence intervals are narrower than target_width, and prints the
+    players' mean scores instead of writing tournament.txt. The
+    RepeatedResults are returned.
+    top_k, if given, plays only the matches needed to know the top_k
+    players with play_top_k(), and prints them, marking players tied at
+    the last place, and the skipped matches instead of writing
+    tournament.txt. What play_top_k() returns is
+    returned.
+    profile, if given, is the name of a JSON file: every strategy call is
+    timed, a table of the time spent in each strategy is printed at the
+    end, and the same figures are written to that file.
+    call_budget and match_budget, if given, are the most seconds a
+    strategy may take for one move and for one match (see Budget); each
+    strategy then runs in a worker process of its own, a move that runs
+    over or raises an exception counts as invalid, and the strategies that
+    ran over or failed are reported at the end. With workers, the matches
+    are played on that many threads. The cache is neither read nor
+    written then.
+    batched plays the matches between strategies that have a batched form,
+    where at least one of them declared it, together, with
+    play_batched_pairs().
+    checkpoint, if given, is the name of a file that keeps the finished
+    matches as they are played (see play_checkpointed()): if the run is
+    stopped, calling play_tournament() again with the same checkpoint
+    plays only the matches that were not finished, with the seed from the
+    checkpoint unless one is given, and gives the same results and
+    tournament.txt as an uninterrupted run. The file is left in place
+    afterwards.
+    '''
+    if call_budget is not None or match_budget is not None:
+        start_budget(call_budget, match_budget)
+        try:
+            return play_tournament(num_players, workers, seed, payoff, cache,
+                                   binary_filename, export_filename,
+                                   repetitions, target_width, top_k, profile,
+                                   batched=batched, checkpoint=checkpoint)
+        finally:
+            stop_budget().print_report()
+    if profile is not None:
+        start_profile()
+        try:
+            return play_tournament(num_players, workers, seed, payoff, cache,
+                                   binary_filename, export_filename,
+                                   repetitions, target_width, top_k,
+                                   batched=batched, checkpoint=checkpoint)
+        finally:
+            timings = stop_profile()
+            timings.print_table()
+            timings.write_json(profile)
+    if seed is None and checkpoint is not None:
+        seed = checkpoint_seed(checkpoint)
+    if seed is None:
+        seed = random.getrandbits(32)
+    if repetitions is not None:
+        results = play_repeated_tournament(num_players, repetitions, seed,
+                                           target_width, payoff, workers,
+                                           cache)
+        print_repeated_results(results)
+        return results
+    if top_k is not None:
+        top, skipped, tournament = play_top_k(num_players, top_k, seed,
+                                              payoff, workers, cache)
+        print('\n\n Top', top_k, 'players, with team strategy names:\n')
+        # the players tied at the last place, if there are more than top_k
+        tied = 0
+        if len(top) > top_k:
+            last = tournament.scores[top[-1]]
+            while tied < len(top) and tournament.scores[top[-1 - tied]] == last:
+                tied += 1
+        for place, player in enumerate(top):
+            if place >= len(top) - tied:
+                print('player ' + str(player), ': ',
+                      tournament.team_names[player], '(tied)')
+            else:
+                print('player ' + str(player), ': ',
+                      tournament.team_names[player])
+        print('\n', len(skipped), 'of', len(tournament_pairs(num_players)),
+              'matches were skipped:', ' '.join('%d-%d' % pair
+                                                for pair in skipped))
+        return (top, skipped, tournament)
+    if binary_filename is not None:
+        # before anything is played, not partway through the run
+        BinaryReport.check_payoff(payoff)
+    opened_cache = cache is not None and not isinstance(cache, MatchCache)
+    if opened_cache:
+        cache = MatchCache(cache)
+    # only the scores per round are kept; the moves go straight to the file
+    tournament = TournamentResults(num_players, keep_moves=False)
     
+    '''report round-level results in a data file'''
+    use_datafile=True
+    report = None
+    if use_datafile:
+        report = TournamentReport(tournament_filename())
+    binary = None
+    if binary_filename is not None:
+        binary = BinaryReport(binary_filename, tournament.team_names)
+    
+    # a game between each player and every other player of lower number
+    jobs = [(player1, player2, seed, 0, payoff)
+            for player1, player2 in tournament_pairs(num_players)]
+    play = play_pairs
+    if batched:
+        play = play_batched_pairs
+    if checkpoint is None:
+        results = play(jobs, workers, cache)
+    else:
+        header = partial_header(num_players, seed, payoff, 1, 0)
+        results = play_checkpointed(jobs, play, checkpoint, header, workers,
+                                    cache)
+    for result in results:
+        tournament.add_match(*result)
+        if report is not None:
+            report.write_match(tournament, *result[:4])
+        if binary is not None:
+            binary.write_match(*result)
+    if opened_cache:
+        cache.close()
+    if report is not None:
+        report.write_summary(tournament)
+    if binary is not None:
+        binary.close()
+    if export_filename is not None:
+        export_results(tournament, export_filename)
+    
+    print_results(tournament)
+
+def main(arguments=None):
+    '''
+    Runs a tournament split over several machines from the command line:
+        python DWprisoners_dilemma.py shard 22 4 0 --seed 42 shard0.jsonl
+    plays shard 0 of 4 of a 22-player tournament on this machine, and
+        python DWprisoners_dilemma.py merge shard0.jsonl ... shard3.jsonl
+    then writes tournament.txt and shows the results.
+    '''
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Play a tournament in shards and merge the results.')
+    commands = parser.add_subparsers(dest='command')
+    sharding = commands.add_parser('shard', help="play one shard's matches")
+    sharding.add_argument('num_players', type=int)
+    sharding.add_argument('shards', type=int)
+    sharding.add_argument('shard', type=int)
+    sharding.add_argument('filename', help='partial result file to write')
+    sharding.add_argument('--seed', type=int, required=True,
+                          help='the same on every machine')
+    sharding.add_argument('--workers', type=int)
+    merging = commands.add_parser('merge', help='merge the partial results')
+    merging.add_argument('filenames', nargs='+')
+    merging.add_argument('--output', help='where to write tournament.txt')
+    options = parser.parse_args(arguments)
+    if options.command == 'shard':
+        play_shard(options.num_players, options.shards, options.shard,
+                   options.seed, options.filename, workers=options.workers)
+    elif options.command == 'merge':
+        print_results(merge_shards(options.filenames, options.output))
+    else:
+        parser.print_help()
+        return 2
+    return 0
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
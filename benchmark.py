@@ -0,0 +1,269 @@
+from __future__ import print_function
+
+'''
+benchmark.py times the tournament engine in DWprisoners_dilemma.py on a few
+fixed-seed scenarios, so a new strategy or engine change that makes a run
+slower shows up before the tournament does.
+
+    python benchmark.py                      run every scenario
+    python benchmark.py builtin long         run some of them
+    python benchmark.py --save base.json     keep the figures as a baseline
+    python benchmark.py --baseline base.json --threshold 0.2
+                                             compare against a baseline
+
+Most scenarios time the matches alone, with play_pair(); the tournament
+scenarios time the whole of play_tournament(), writing tournament.txt to
+a temporary directory, serially and with a pool of workers.
+
+Each scenario reports rounds per second, matches per second and the peak
+memory the scenario allocated. Against a baseline, a scenario that is
+slower or bigger by more than the threshold (a fraction) is a regression,
+and the exit status is 1.
+'''
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import DWprisoners_dilemma as dilemma
+
+# every scenario uses this tournament seed
+SEED = 12345
+# synthetic strategies get player numbers from here up
+SYNTHETIC_START = 1000
+
+def builtin_players():
+    '''Returns the player numbers of the strategies in DWprisoners_dilemma.'''
+    return sorted(player for player in dilemma.STRATEGIES
+                  if player < SYNTHETIC_START)
+
+def play_field(players, rounds=None):
+    '''
+    Plays each of players against each other, serially, and returns
+    2-tuple (matches, rounds played).
+    rounds, if given, is the exact length of every match instead of
+    dilemma.ROUNDS.
+    '''
+    saved = dilemma.ROUNDS
+    if rounds is not None:
+        dilemma.ROUNDS = (rounds, rounds)
+    try:
+        matches = 0
+        total = 0
+        for index, player1 in enumerate(players):
+            for player2 in players[:index]:
+                result = dilemma.play_pair((player1, player2, SEED, 0, None))
+                matches += 1
+                total += len(result[2])
+    finally:
+        dilemma.ROUNDS = saved
+    return (matches, total)
+
+def synthetic_table(player):
+    '''Returns the MemoryOne table synthetic player number player plays.'''
+    rng = random.Random(player)
+    return dilemma.MemoryOne(*[rng.choice('cb') for move in range(5)])
+
+def memory_one_function(table):
+    '''Returns a strategy function that plays the MemoryOne table.'''
+    def play(history, opponent_history, score, opponent_score, context):
+        if len(history) == 0:
+            return table.opening
+        return table.responses[(history[-1], opponent_history[-1])]
+    return play
+
+def synthetic_players(count):
+    '''
+    Enters count synthetic memory-one strategies, the same ones every
+    time, and returns their player numbers.
+    '''
+    players = list(range(SYNTHETIC_START, SYNTHETIC_START + count))
+    for player in players:
+        if player not in dilemma.STRATEGIES:
+            table = synthetic_table(player)
+            dilemma.strategy(player, 'synthetic %d' % player,
+                             memory_one=table)(memory_one_function(table))
+    return players
+
+def builtin():
+    '''Every built-in strategy against every other.'''
+    return play_field(builtin_players())
+
+def memory_one_field(count):
+    def scenario():
+        return play_field(synthetic_players(count))
+    scenario.__doc__ = ('A field of %d synthetic memory-one strategies.' %
+                        count)
+    return scenario
+
+def long_matches():
+    '''Every built-in strategy against every other, 10000 rounds a match.'''
+    return play_field(builtin_players(), rounds=10000)
+
+def whole_tournament(workers=None):
+    '''
+    Plays the built-in strategies' tournament with play_tournament(), report
+    and all, and returns 2-tuple (matches, rounds played). tournament.txt
+    is written to a temporary directory, and the results it prints are
+    thrown away.
+    '''
+    num_players = max(builtin_players()) + 1
+    directory = tempfile.mkdtemp()
+    saved = (dilemma.tournament_filename, sys.stdout)
+    dilemma.tournament_filename = lambda: os.path.join(directory,
+                                                       'tournament.txt')
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        dilemma.play_tournament(num_players, workers=workers, seed=SEED)
+    finally:
+        sys.stdout.close()
+        dilemma.tournament_filename, sys.stdout = saved
+        shutil.rmtree(directory)
+    pairs = dilemma.tournament_pairs(num_players)
+    # every match lasts as long as its random stream says, fast-forwarded
+    # or not
+    rounds = sum(dilemma.match_rng(SEED, player1, player2).randint(
+                     dilemma.ROUNDS[0], dilemma.ROUNDS[1])
+                 for player1, player2 in pairs)
+    return (len(pairs), rounds)
+
+def tournament():
+    '''The built-in tournament, played and reported by play_tournament().'''
+    return whole_tournament()
+
+def tournament_workers():
+    '''The same with play_tournament(workers=4).'''
+    return whole_tournament(workers=4)
+
+SCENARIOS = [
+    ('builtin', builtin),
+    ('memory-one-100', memory_one_field(100)),
+    ('memory-one-500', memory_one_field(500)),
+    ('memory-one-1000', memory_one_field(1000)),
+    ('long', long_matches),
+    ('tournament', tournament),
+    ('tournament-workers', tournament_workers),
+]
+
+def peak_memory(scenario):
+    '''
+    Returns the peak bytes allocated while running scenario, or None
+    where tracemalloc is not available (Python 2).
+    '''
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+    tracemalloc.start()
+    try:
+        scenario()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def run_scenario(scenario, repeat=1, memory=True):
+    '''
+    Runs scenario repeat times and returns a dict of its figures from the
+    fastest run: seconds, matches, rounds, rounds_per_second,
+    matches_per_second and peak_memory (a separate run, since tracing
+    memory slows everything down).
+    '''
+    best = None
+    for run in range(repeat):
+        start = dilemma.timer()
+        matches, rounds = scenario()
+        seconds = dilemma.timer() - start
+        if best is None or seconds < best:
+            best = seconds
+    figures = {'seconds': best,
+               'matches': matches,
+               'rounds': rounds,
+               'rounds_per_second': rounds/best,
+               'matches_per_second': matches/best,
+               'peak_memory': None}
+    if memory:
+        figures['peak_memory'] = peak_memory(scenario)
+    return figures
+
+def regressions(results, baseline, threshold):
+    '''
+    Returns a list of messages, one for each figure in results that is
+    worse than the same figure in baseline by more than threshold.
+    '''
+    messages = []
+    for name, figures in sorted(results.items()):
+        if name not in baseline:
+            continue
+        base = baseline[name]
+        for key in ('rounds_per_second', 'matches_per_second'):
+            if figures[key] < base[key]*(1 - threshold):
+                messages.append('%s: %s fell from %.0f to %.0f' %
+                                (name, key, base[key], figures[key]))
+        if figures['peak_memory'] is not None and \
+                base.get('peak_memory') is not None and \
+                figures['peak_memory'] > base['peak_memory']*(1 + threshold):
+            messages.append('%s: peak_memory rose from %d to %d' %
+                            (name, base['peak_memory'],
+                             figures['peak_memory']))
+    return messages
+
+def main(arguments=None):
+    names = [name for name, scenario in SCENARIOS]
+    parser = argparse.ArgumentParser(
+        description='Time the tournament engine on fixed-seed scenarios.')
+    parser.add_argument('scenarios', nargs='*', metavar='scenario',
+                        help='scenarios to run, from: ' + ', '.join(names) +
+                        ' (default: all)')
+    parser.add_argument('--baseline',
+                        help='JSON file of earlier figures to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fraction by which a figure may be worse than '
+                        'the baseline (default: 0.1)')
+    parser.add_argument('--save', help='JSON file to write the figures to')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='times to run each scenario, keeping the '
+                        'fastest (default: 3)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip measuring peak memory')
+    options = parser.parse_args(arguments)
+    for name in options.scenarios:
+        if name not in names:
+            parser.error('unknown scenario %r' % name)
+    chosen = options.scenarios or names
+
+    results = {}
+    print('scenario\tseconds\tmatches\trounds\trounds/s\tmatches/s\tpeak KiB')
+    for name, scenario in SCENARIOS:
+        if name not in chosen:
+            continue
+        figures = run_scenario(scenario, options.repeat,
+                               not options.no_memory)
+        results[name] = figures
+        peak = figures['peak_memory']
+        print('%s\t%.3f\t%d\t%d\t%.0f\t%.0f\t%s' % (
+            name, figures['seconds'], figures['matches'], figures['rounds'],
+            figures['rounds_per_second'], figures['matches_per_second'],
+            '-' if peak is None else '%d' % (peak//1024)))
+        sys.stdout.flush()
+
+    if options.save:
+        with open(options.save, 'w') as output:
+            json.dump(results, output, indent=1, sort_keys=True)
+    if options.baseline:
+        with open(options.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        messages = regressions(results, baseline, options.threshold)
+        if messages:
+            print('\nRegressions against %s:' % options.baseline)
+            for message in messages:
+                print('  ' + message)
+            return 1
+        print('\nNo regressions against %s.' % options.baseline)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,423 @@
+'''
+bot_runner.py plays the tournament against strategies that run as their own
+long-lived processes ("bots") instead of functions in DWprisoners_dilemma.py.
+It needs Python 3: the matches are played concurrently with asyncio, so
+waiting on one bot never holds up the matches that do not involve it.
+
+A bot is reached either through a command, which is started and talked to
+over its stdin and stdout, or through a Unix socket it listens on. Either
+way the bot reads and writes one JSON object per line. For each move it is
+sent
+    {"id": 7, "match": 3, "history": "ccb", "opponent_history": "cbb",
+     "score": -250, "opponent_score": -150}
+and answers with the same id:
+    {"id": 7, "move": "c"}
+Requests from different matches can be in flight at the same time, and the
+answers may come back in any order. When a match is over the bot is sent
+{"match": 3, "end": true}, which needs no answer, so it can forget anything
+it kept for that match.
+Before any of that, each new connection is sent {"id": 1, "hello": true},
+to be answered with {"id": 1} once the bot is ready.
+A move that is not 'c' or 'b', that does not arrive within the timeout, or
+that cannot be asked for because the bot has gone away counts as an invalid
+move, just like in play_round().
+
+    python bot_runner.py serve 5
+        serves built-in strategy 5 as a bot on stdin and stdout
+    python bot_runner.py serve 5 --socket /tmp/player5.sock
+        the same, on a Unix socket
+    python bot_runner.py play --builtin 0 1 2 \\
+            --bot 'Liam?=python bot_runner.py serve 5' \\
+            --socket-bot 'Mitchell=/tmp/player8.sock'
+        plays a tournament between built-in strategies and bots
+'''
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+
+import DWprisoners_dilemma as dilemma
+
+class BotError(Exception):
+    '''Raised when a bot cannot be asked for a move.'''
+
+class BotConnection(object):
+    '''
+    One persistent connection to a bot. Any number of requests can be
+    waiting on it at once: each gets its own id, and a listening task
+    hands each answer to the request with that id.
+    '''
+    def __init__(self, reader, writer, process=None):
+        self.reader = reader
+        self.writer = writer
+        self.process = process
+        self.pending = {}
+        self.next_id = 0
+        self.closed = False
+        self.listener = asyncio.ensure_future(self.listen())
+
+    async def listen(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    continue # not an answer; ignore it
+                if not isinstance(message, dict):
+                    continue
+                future = self.pending.pop(message.get('id'), None)
+                if future is not None and not future.done():
+                    future.set_result(message)
+        finally:
+            self.closed = True
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(BotError('the bot went away'))
+            self.pending.clear()
+
+    def send(self, message):
+        if self.closed:
+            raise BotError('the bot went away')
+        self.writer.write((json.dumps(message) + '\n').encode('utf-8'))
+
+    async def request(self, message, timeout):
+        '''
+        Sends message with a new id and returns the bot's answer. Raises
+        asyncio.TimeoutError if it takes longer than timeout seconds, and
+        BotError if the bot goes away.
+        '''
+        self.next_id += 1
+        request_id = self.next_id
+        future = asyncio.get_event_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            message = dict(message, id=request_id)
+            self.send(message)
+            await self.writer.drain()
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # an OSError too, from Python 3.11 on
+            raise
+        except (ConnectionError, OSError):
+            raise BotError('the bot went away')
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def close(self):
+        self.closed = True
+        try:
+            self.writer.close()
+        except (ConnectionError, OSError):
+            pass
+        self.listener.cancel()
+        if self.process is not None:
+            if self.process.returncode is None:
+                self.process.terminate()
+            await self.process.wait()
+
+async def connect_command(command):
+    '''Starts a bot with the shell command and connects to its stdio.'''
+    process = await asyncio.create_subprocess_shell(
+        command, stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE)
+    return BotConnection(process.stdout, process.stdin, process)
+
+async def connect_socket(path):
+    '''Connects to a bot listening on the Unix socket at path.'''
+    reader, writer = await asyncio.open_unix_connection(path)
+    return BotConnection(reader, writer)
+
+class Bot(object):
+    '''
+    A strategy played by a bot, reached through command or socket_path.
+    connections is the number of connections kept open to it (for a
+    command, the number of copies of it started), which the matches are
+    shared out over; every request for one match goes over the same
+    connection, so a bot can keep what it needs for a match between moves.
+    timeout is how many seconds the bot has to answer each request, and
+    start_timeout how many it has to answer the hello on a new connection.
+    timeouts and errors count the requests that ran out of time, and
+    those that failed because the bot had gone away.
+    '''
+    def __init__(self, team_name, command=None, socket_path=None,
+                 connections=1, timeout=1.0, start_timeout=10.0):
+        if (command is None) == (socket_path is None):
+            raise ValueError('a bot needs a command or a socket_path')
+        self.team_name = team_name
+        self.command = command
+        self.socket_path = socket_path
+        self.size = connections
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+        self.connections = []
+        self.timeouts = 0
+        self.errors = 0
+
+    async def connect(self):
+        '''
+        Opens the connections and waits until the bot has answered the
+        hello on each, so its start-up time is not taken out of the first
+        moves' timeouts.
+        '''
+        for connection in range(self.size):
+            if self.command is not None:
+                connection = await connect_command(self.command)
+            else:
+                connection = await connect_socket(self.socket_path)
+            self.connections.append(connection)
+        await asyncio.gather(*[connection.request({'hello': True},
+                                                  self.start_timeout)
+                               for connection in self.connections])
+
+    def connection(self, match):
+        return self.connections[match % len(self.connections)]
+
+    async def move(self, match, history, opponent_history, score,
+                   opponent_score):
+        '''Asks the bot for its move in match; ' ' if it gave none.'''
+        try:
+            answer = await self.connection(match).request(
+                {'match': match, 'history': str(history),
+                 'opponent_history': str(opponent_history),
+                 'score': score, 'opponent_score': opponent_score},
+                self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return ' '
+        except BotError:
+            self.errors += 1
+            return ' '
+        return answer.get('move')
+
+    def end_match(self, match):
+        try:
+            self.connection(match).send({'match': match, 'end': True})
+        except (BotError, ConnectionError, OSError):
+            pass
+
+    async def close(self):
+        for connection in self.connections:
+            await connection.close()
+        self.connections = []
+
+class LocalPlayer(object):
+    '''A strategy entered in DWprisoners_dilemma, played in this process.'''
+    def __init__(self, player):
+        self.player = player
+        self.team_name = dilemma.get_action(player, '', '', 0, 0,
+                                            getting_team_name=True)
+        self.function = dilemma.resolve_strategy(player)
+
+async def play_bot_match(match, entrant1, entrant2, rng, payoff=None):
+    '''
+    Plays a match between two entrants, each a Bot or a LocalPlayer, like
+    play_iterative_rounds(): the number of rounds comes from rng, which
+    local strategies also use for their random choices. Both players are
+    asked for each move at the same time.
+    Returns 4-tuple (moves1, moves2, score1, score2).
+    '''
+    number_of_rounds = rng.randint(dilemma.ROUNDS[0], dilemma.ROUNDS[1])
+    moves1 = dilemma.History()
+    moves2 = dilemma.History()
+    score1 = 0
+    score2 = 0
+    context1 = dilemma.MatchContext(rng)
+    context2 = dilemma.MatchContext(rng)
+
+    async def ask(entrant, history, opponent_history, score, opponent_score,
+                  context):
+        if isinstance(entrant, Bot):
+            return await entrant.move(match, history, opponent_history,
+                                      score, opponent_score)
+        return entrant.function(history, opponent_history, score,
+                                opponent_score, context)
+
+    for round in range(number_of_rounds):
+        # a local strategy moves first, as in play_round(), so any use of
+        # rng happens in the same order
+        action1, action2 = await asyncio.gather(
+            ask(entrant1, moves1, moves2, score1, score2, context1),
+            ask(entrant2, moves2, moves1, score2, score1, context2))
+        if type(action1) != str or action1 not in ('c', 'b'):
+            action1 = ' '
+        if type(action2) != str or action2 not in ('c', 'b'):
+            action2 = ' '
+        moves1.append(action1)
+        moves2.append(action2)
+        points1, points2 = dilemma.score_round(action1, action2, payoff)
+        context1.stats.update(action1, action2, points1)
+        context2.stats.update(action2, action1, points2)
+        score1 += points1
+        score2 += points2
+    for entrant in (entrant1, entrant2):
+        if isinstance(entrant, Bot):
+            entrant.end_match(match)
+    return (moves1, moves2, score1, score2)
+
+async def play_bot_tournament(entrants, seed=None, payoff=None,
+                              concurrency=100):
+    '''
+    Plays every entrant against every other, each a Bot or a LocalPlayer,
+    with up to concurrency matches under way at once. Entrant number n
+    plays as player n, with the match_rng() streams of play_tournament().
+    Returns the TournamentResults.
+    '''
+    if seed is None:
+        seed = random.getrandbits(32)
+    bots = [entrant for entrant in entrants if isinstance(entrant, Bot)]
+    limit = asyncio.Semaphore(concurrency)
+
+    async def play(match, player1, player2):
+        async with limit:
+            return (player1, player2) + await play_bot_match(
+                match, entrants[player1], entrants[player2],
+                dilemma.match_rng(seed, player1, player2), payoff)
+
+    pairs = dilemma.tournament_pairs(len(entrants))
+    try:
+        # inside the try, so the bots already started are stopped if one
+        # of them fails to start
+        for bot in bots:
+            await bot.connect()
+        played = await asyncio.gather(*[play(match, player1, player2)
+                                        for match, (player1, player2)
+                                        in enumerate(pairs)])
+    finally:
+        for bot in bots:
+            await bot.close()
+    tournament = dilemma.TournamentResults(
+        len(entrants), keep_moves=False,
+        team_names=[entrant.team_name for entrant in entrants])
+    for result in played:
+        tournament.add_match(*result)
+    return tournament
+
+class Server(object):
+    '''
+    Answers a bot's requests with built-in strategy player, keeping a
+    MatchContext for each match until it is told the match is over.
+    '''
+    def __init__(self, player):
+        self.function = dilemma.resolve_strategy(player)
+        self.contexts = {}
+
+    def answer(self, line):
+        '''Returns the answer to one request line, or None if it needs none.'''
+        request = json.loads(line)
+        if request.get('hello'):
+            return json.dumps({'id': request['id']}) + '\n'
+        match = request.get('match')
+        if request.get('end'):
+            self.contexts.pop(match, None)
+            return None
+        history = dilemma.History(request['history'])
+        opponent_history = dilemma.History(request['opponent_history'])
+        context = self.contexts.setdefault(
+            match, dilemma.MatchContext(random.Random(match)))
+        context.stats = dilemma.MatchStats.from_histories(history,
+                                                          opponent_history)
+        move = self.function(history, opponent_history, request['score'],
+                             request['opponent_score'], context)
+        return json.dumps({'id': request['id'], 'move': move}) + '\n'
+
+def serve_stdio(player):
+    '''Serves built-in strategy player as a bot on stdin and stdout.'''
+    server = Server(player)
+    for line in iter(sys.stdin.readline, ''):
+        answer = server.answer(line)
+        if answer is not None:
+            sys.stdout.write(answer)
+            sys.stdout.flush()
+
+async def serve_socket(player, path):
+    '''
+    Serves built-in strategy player as a bot on a Unix socket, each
+    connection with its own matches.
+    '''
+    async def connected(reader, writer):
+        server = Server(player)
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            answer = server.answer(line)
+            if answer is not None:
+                writer.write(answer.encode('utf-8'))
+                await writer.drain()
+        writer.close()
+    server = await asyncio.start_unix_server(connected, path)
+    async with server:
+        await server.serve_forever()
+
+def named(text):
+    '''Splits 'team name=target' for the command line.'''
+    if '=' not in text:
+        raise argparse.ArgumentTypeError('expected TEAM=TARGET, got %r' %
+                                         text)
+    return tuple(text.split('=', 1))
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(
+        description='Play the tournament against strategies run as bots.')
+    commands = parser.add_subparsers(dest='command')
+    serving = commands.add_parser('serve',
+                                  help='serve a built-in strategy as a bot')
+    serving.add_argument('player', type=int)
+    serving.add_argument('--socket', help='Unix socket to listen on '
+                         '(default: stdin and stdout)')
+    playing = commands.add_parser('play', help='play a tournament')
+    playing.add_argument('--builtin', type=int, nargs='*', default=[],
+                         help='built-in strategies to play')
+    playing.add_argument('--bot', type=named, action='append', default=[],
+                         metavar='TEAM=COMMAND',
+                         help='a bot started with a shell command')
+    playing.add_argument('--socket-bot', type=named, action='append',
+                         default=[], metavar='TEAM=PATH',
+                         help='a bot listening on a Unix socket')
+    playing.add_argument('--seed', type=int)
+    playing.add_argument('--timeout', type=float, default=1.0,
+                         help='seconds a bot has for each move (default: 1)')
+    playing.add_argument('--connections', type=int, default=1,
+                         help='connections to keep open to each bot '
+                         '(default: 1)')
+    playing.add_argument('--concurrency', type=int, default=100,
+                         help='matches to play at once (default: 100)')
+    options = parser.parse_args(arguments)
+
+    if options.command == 'serve':
+        if options.socket:
+            asyncio.run(serve_socket(options.player, options.socket))
+        else:
+            serve_stdio(options.player)
+        return 0
+    if options.command != 'play':
+        parser.print_help()
+        return 2
+    entrants = [LocalPlayer(player) for player in options.builtin]
+    entrants += [Bot(team_name, command=command,
+                     connections=options.connections, timeout=options.timeout)
+                 for team_name, command in options.bot]
+    entrants += [Bot(team_name, socket_path=path,
+                     connections=options.connections, timeout=options.timeout)
+                 for team_name, path in options.socket_bot]
+    tournament = asyncio.run(play_bot_tournament(entrants, options.seed,
+                                                 concurrency=
+                                                 options.concurrency))
+    print('\n Average per round, with team strategy names:\n')
+    for player, entrant in enumerate(entrants):
+        problems = ''
+        if isinstance(entrant, Bot) and (entrant.timeouts or entrant.errors):
+            problems = '  (%d timed out, %d failed)' % (entrant.timeouts,
+                                                        entrant.errors)
+        print('player %d : %.2f points: %s%s' % (
+            player, tournament.scores[player]/len(entrants),
+            entrant.team_name, problems))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
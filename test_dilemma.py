@@ -0,0 +1,416 @@
+from __future__ import print_function
+
+'''
+test_dilemma.py checks that the engine's shortcuts in DWprisoners_dilemma.py
+give the same matches as playing every round, and that the ways of
+splitting up a tournament give the same results as playing it in one go.
+
+    python -m unittest test_dilemma
+'''
+
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import DWprisoners_dilemma as dilemma
+
+# every test tournament uses this seed
+SEED = 42
+# the built-in strategies
+NUM_PLAYERS = 22
+# a payoff matrix that is not the default and not whole numbers
+FRACTIONAL_PAYOFF = dilemma.PayoffMatrix(release=0.5, treat=1.5,
+                                         severe_punishment=-1.25,
+                                         punishment=0.25)
+
+def play_every_round(function1, function2, number_of_rounds, rng=None,
+                     payoff=None):
+    '''
+    Plays a match between two strategy functions by calling them every
+    round, with none of play_match()'s shortcuts, and returns 4-tuple
+    (moves1, moves2, score1, score2).
+    '''
+    moves1 = dilemma.History()
+    moves2 = dilemma.History()
+    score1 = 0
+    score2 = 0
+    context1 = dilemma.MatchContext(rng)
+    context2 = dilemma.MatchContext(rng)
+    for round in range(number_of_rounds):
+        moves1, moves2, score1, score2 = dilemma.play_round(
+            function1, function2, moves1, moves2, score1, score2,
+            context1, context2, payoff)
+    return (moves1, moves2, score1, score2)
+
+def play_job_every_round(job):
+    '''Returns what play_pair(job) should, from play_every_round().'''
+    player1, player2, seed, repetition, payoff = job
+    rng = dilemma.match_rng(seed, player1, player2, repetition)
+    number_of_rounds = rng.randint(dilemma.ROUNDS[0], dilemma.ROUNDS[1])
+    return (player1, player2) + play_every_round(
+        dilemma.resolve_strategy(player1), dilemma.resolve_strategy(player2),
+        number_of_rounds, rng, payoff)
+
+def table_function(table):
+    '''Returns a strategy function that plays a MemoryOne table.'''
+    def play(history, opponent_history, score, opponent_score, context):
+        if len(history) == 0:
+            return table.opening
+        return table.responses[(history[-1], opponent_history[-1])]
+    return play
+
+def tournament_jobs(payoff=None):
+    return [(player1, player2, SEED, 0, payoff)
+            for player1, player2 in dilemma.tournament_pairs(NUM_PLAYERS)]
+
+def has_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return False
+    return True
+
+class ShortcutTest(unittest.TestCase):
+    '''The fast paths against playing every round.'''
+
+    def assertMatch(self, result, expected):
+        # moves and scores; which shortcut was taken is not compared
+        self.assertEqual([str(result[0]), str(result[1])],
+                         [str(expected[0]), str(expected[1])])
+        self.assertEqual(result[2:4], expected[2:4])
+        self.assertEqual([type(score) for score in result[2:4]],
+                         [type(score) for score in expected[2:4]])
+
+    def test_memory_one_tables(self):
+        # every pair of the 32 MemoryOne tables
+        tables = [dilemma.MemoryOne(*moves)
+                  for moves in itertools.product('cb', repeat=5)]
+        for table1, table2 in itertools.product(tables, repeat=2):
+            for number_of_rounds in (1, 7, 50):
+                self.assertMatch(
+                    dilemma.play_memory_one(table1, table2,
+                                            number_of_rounds),
+                    play_every_round(table_function(table1),
+                                     table_function(table2),
+                                     number_of_rounds))
+
+    def test_builtin_pairs(self):
+        # memory-one, compiled tables, fast-forwarding and plain play
+        for payoff in (None, FRACTIONAL_PAYOFF):
+            for job in tournament_jobs(payoff):
+                result = dilemma.play_pair(job)
+                expected = play_job_every_round(job)
+                self.assertEqual(result[:2], expected[:2])
+                self.assertMatch(result[2:6], expected[2:])
+
+    def test_compiled_tables(self):
+        players = [player for player in range(NUM_PLAYERS)
+                   if dilemma.memory_table(player) is not None]
+        self.assertTrue(players)
+        for player1, player2 in itertools.product(players, repeat=2):
+            self.assertMatch(
+                dilemma.play_memory_tables(dilemma.memory_table(player1),
+                                           dilemma.memory_table(player2),
+                                           150),
+                play_every_round(dilemma.resolve_strategy(player1),
+                                 dilemma.resolve_strategy(player2), 150))
+
+    @unittest.skipIf(not has_numpy(), 'needs numpy')
+    def test_score_moves(self):
+        for payoff in (None, FRACTIONAL_PAYOFF):
+            for job in tournament_jobs(payoff)[::7]:
+                result = dilemma.play_pair(job)
+                points1, points2, score1, score2 = dilemma.score_moves(
+                    result[2], result[3], payoff)
+                self.assertEqual((score1[-1], score2[-1]), result[4:6])
+
+    @unittest.skipIf(not has_numpy(), 'needs numpy')
+    def test_batched(self):
+        import numpy
+        def batch(histories, opponent_histories):
+            # tit for tat: copy the opponent's last move
+            if histories.shape[1] == 0:
+                return numpy.zeros(histories.shape[0], dtype=numpy.uint8)
+            return opponent_histories[:, -1].copy()
+        def tit_for_tat(history, opponent_history, score, opponent_score,
+                        context):
+            if len(opponent_history) == 0:
+                return 'c'
+            return opponent_history[-1]
+        player = 900
+        dilemma.strategy(player, 'tit for tat', batch=batch)(tit_for_tat)
+        try:
+            players = [player] + [other for other in range(NUM_PLAYERS)
+                                  if dilemma.batch_function(other)]
+            for payoff in (None, FRACTIONAL_PAYOFF):
+                jobs = [(player1, player2, SEED, 0, payoff)
+                        for player1, player2
+                        in itertools.combinations(players, 2)]
+                for job, result in zip(jobs, dilemma.play_batched(jobs)):
+                    expected = dilemma.play_pair(job)
+                    self.assertEqual(result[:2], expected[:2])
+                    self.assertMatch(result[2:6], expected[2:6])
+        finally:
+            del dilemma.STRATEGIES[player]
+
+class TournamentTest(unittest.TestCase):
+    '''Ways of playing a whole tournament against playing it in one go.'''
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.saved = (dilemma.tournament_filename, sys.stdout)
+        dilemma.tournament_filename = lambda: self.path('tournament.txt')
+        sys.stdout = open(os.devnull, 'w')
+
+    def tearDown(self):
+        sys.stdout.close()
+        dilemma.tournament_filename, sys.stdout = self.saved
+        shutil.rmtree(self.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def play(self, **options):
+        '''Plays the tournament and returns the tournament.txt it wrote.'''
+        dilemma.play_tournament(NUM_PLAYERS, seed=SEED, **options)
+        with open(self.path('tournament.txt')) as report:
+            return report.read()
+
+    def test_workers(self):
+        jobs = tournament_jobs()
+        self.assertEqual(list(dilemma.play_pairs(jobs, workers=3)),
+                         [dilemma.play_pair(job) for job in jobs])
+        self.assertEqual(self.play(workers=3), self.play())
+
+    def test_cache(self):
+        expected = self.play()
+        for run in range(2):
+            self.assertEqual(self.play(cache=self.path('cache.db')),
+                             expected)
+
+    def test_binary(self):
+        filename = self.path('tournament.bin')
+        self.play(binary_filename=filename)
+        results = dilemma.BinaryResults(filename)
+        try:
+            for job in tournament_jobs():
+                player1, player2, moves1, moves2, score1, score2, \
+                    fast_forwarded = dilemma.play_pair(job)
+                self.assertEqual(results.moves(player1, player2),
+                                 (str(moves1), str(moves2)))
+                self.assertEqual(results.match(player2, player1),
+                                 (len(moves1), score2, score1,
+                                  fast_forwarded))
+        finally:
+            results.close()
+        self.assertRaises(ValueError, dilemma.play_tournament, NUM_PLAYERS,
+                          seed=SEED, payoff=FRACTIONAL_PAYOFF,
+                          binary_filename=filename)
+
+    def test_binary_invalid_moves(self):
+        # invalid moves are stored apart from the bits of the valid ones
+        filename = self.path('invalid.bin')
+        matches = [(1, 0, 'cb cc b', 'bbcc  c', -7, 12),
+                   (2, 0, 'c'*9, 'b'*9, 0, 0),
+                   (2, 1, ' ', 'b', 0, 3)]
+        report = dilemma.BinaryReport(filename, ['zero', 'one', 'two'])
+        for match in matches:
+            report.write_match(*match)
+        report.close()
+        results = dilemma.BinaryResults(filename)
+        try:
+            self.assertEqual(results.team_names, ['zero', 'one', 'two'])
+            for player1, player2, moves1, moves2, score1, score2 in matches:
+                self.assertEqual(results.moves(player1, player2),
+                                 (moves1, moves2))
+                self.assertEqual(results.moves(player2, player1),
+                                 (moves2, moves1))
+                self.assertEqual(results.match(player1, player2),
+                                 (len(moves1), score1, score2, None))
+            self.assertEqual(results.score_matrix()[0][1], 12/7.0)
+        finally:
+            results.close()
+
+    def test_shard_merge(self):
+        expected = self.play()
+        filenames = [self.path('shard%d.jsonl' % shard) for shard in range(3)]
+        for shard, filename in enumerate(filenames):
+            dilemma.play_shard(NUM_PLAYERS, 3, shard, SEED, filename)
+        dilemma.merge_shards(filenames, self.path('merged.txt'))
+        with open(self.path('merged.txt')) as merged:
+            self.assertEqual(merged.read(), expected)
+
+    def test_checkpoint_resume(self):
+        checkpoint = self.path('checkpoint.jsonl')
+        expected = self.play(checkpoint=checkpoint)
+        size = os.path.getsize(checkpoint)
+        # as if the run had stopped partway, in the middle of a line
+        with open(checkpoint, 'r+') as partial:
+            partial.truncate(size*6//10)
+        dilemma.play_tournament(NUM_PLAYERS, checkpoint=checkpoint)
+        with open(self.path('tournament.txt')) as report:
+            self.assertEqual(report.read(), expected)
+        self.assertEqual(os.path.getsize(checkpoint), size)
+
+class RepeatedTest(unittest.TestCase):
+    '''Stopping repeated tournaments early.'''
+
+    def test_confidence_t(self):
+        self.assertEqual(dilemma.confidence_t(1), 12.706)
+        self.assertEqual(dilemma.confidence_t(30), 2.042)
+        # past the table it keeps shrinking towards z
+        self.assertTrue(2.042 > dilemma.confidence_t(31) >
+                        dilemma.confidence_t(1000) > dilemma.CONFIDENCE_Z)
+        self.assertAlmostEqual(dilemma.confidence_t(60), 2.000, places=3)
+
+    def test_settled_count(self):
+        # however wide the target, no pairing settles before SETTLED_COUNT
+        results = dilemma.play_repeated_tournament(
+            NUM_PLAYERS, dilemma.SETTLED_COUNT + 5, seed=1, target_width=1000)
+        counts = set(stats.count for row in results.stats for stats in row
+                     if stats is not None)
+        self.assertEqual(counts, set([dilemma.SETTLED_COUNT]))
+
+class TopKTest(unittest.TestCase):
+    '''play_top_k() against the full tournament.'''
+
+    def test_top_k(self):
+        tournament = dilemma.TournamentResults(NUM_PLAYERS, keep_moves=False)
+        for result in dilemma.play_pairs(tournament_jobs()):
+            tournament.add_match(*result)
+        ranking = sorted(range(NUM_PLAYERS),
+                         key=lambda player: -tournament.scores[player])
+        for k in (1, 3, 10):
+            top, skipped, partial = dilemma.play_top_k(NUM_PLAYERS, k, SEED)
+            self.assertEqual(sorted(top), sorted(ranking[:k]))
+
+    def test_ties(self):
+        # always-b players all finish level, ahead of the always-c ones
+        field = 'cbcbcb'
+        saved = dict(dilemma.STRATEGIES)
+        def always(move):
+            def play(history, opponent_history, score, opponent_score,
+                     context):
+                return move
+            return play
+        try:
+            for player, move in enumerate(field):
+                del dilemma.STRATEGIES[player]
+                dilemma.strategy(player, 'always ' + move,
+                                 memory_one=dilemma.MemoryOne(*[move]*5))(
+                                     always(move))
+            for k, expected in ((1, [1, 3, 5]), (3, [1, 3, 5]),
+                                (4, [1, 3, 5, 0, 2, 4])):
+                top, skipped, tournament = dilemma.play_top_k(len(field), k,
+                                                              SEED)
+                self.assertEqual(sorted(top[:3]), expected[:3])
+                self.assertEqual(sorted(top[3:]), sorted(expected[3:]))
+        finally:
+            dilemma.STRATEGIES.clear()
+            dilemma.STRATEGIES.update(saved)
+
+@unittest.skipIf(not hasattr(os, 'fork'), 'budgets fork their workers')
+class BudgetTest(unittest.TestCase):
+    '''Strategies played in worker processes under a time budget.'''
+
+    def tearDown(self):
+        dilemma.stop_budget()
+
+    def test_same_moves(self):
+        # a strategy within its budget plays as it does without one
+        jobs = tournament_jobs()[::7]
+        expected = [dilemma.play_pair(job) for job in jobs]
+        dilemma.start_budget(1.0, 10.0)
+        for workers in (None, 2):
+            results = list(dilemma.play_pairs(jobs, workers))
+            self.assertEqual([[str(item) for item in result[:6]]
+                              for result in results],
+                             [[str(item) for item in result[:6]]
+                              for result in expected])
+        self.assertEqual(dilemma.stop_budget().overruns, {})
+
+    def test_offenders(self):
+        def sleepy(history, opponent_history, score, opponent_score,
+                   context):
+            time.sleep(0.2)
+            return 'c'
+        def crashy(history, opponent_history, score, opponent_score,
+                   context):
+            if len(history) == 3:
+                raise RuntimeError('crashy gives up')
+            if len(history) == 6:
+                while True:
+                    pass
+            return 'b'
+        dilemma.strategy(900, 'sleepy')(sleepy)
+        dilemma.strategy(901, 'crashy')(crashy)
+        try:
+            dilemma.start_budget(0.01, 0.05)
+            started = time.time()
+            result = dilemma.play_pair((901, 900, SEED, 0, None))
+            # each of them is cut short, not waited for
+            self.assertTrue(time.time() - started < 2)
+            moves1, moves2 = str(result[2]), str(result[3])
+            self.assertEqual(moves1[:6], 'bbb bb')
+            self.assertEqual(moves1[6:], ' '*(len(moves1) - 6))
+            self.assertEqual(moves2, ' '*len(moves2))
+            overruns = dilemma.stop_budget().overruns
+            self.assertEqual(overruns[901][2], 1)
+            self.assertEqual(overruns[901][1], 1)
+            self.assertEqual(overruns[900][1], 1)
+            self.assertTrue(overruns[900][0] >= 1)
+        finally:
+            del dilemma.STRATEGIES[900]
+            del dilemma.STRATEGIES[901]
+
+@unittest.skipIf(sys.version_info[0] < 3, 'bot_runner needs Python 3')
+class BotTest(unittest.TestCase):
+    '''Strategies served by bots against the same strategies in process.'''
+
+    def test_bots(self):
+        import asyncio
+        import bot_runner
+        # deterministic strategies, which need nothing from the match's
+        # random stream, served by bots; the rest played locally
+        served = (5, 8)
+        script = os.path.join(os.path.dirname(os.path.abspath(
+            bot_runner.__file__)), 'bot_runner.py')
+        entrants = []
+        for player in range(NUM_PLAYERS):
+            local = bot_runner.LocalPlayer(player)
+            if player in served:
+                entrants.append(bot_runner.Bot(
+                    local.team_name, timeout=10.0,
+                    command='"%s" "%s" serve %d' % (sys.executable, script,
+                                                    player)))
+            else:
+                entrants.append(local)
+        tournament = asyncio.run(bot_runner.play_bot_tournament(entrants,
+                                                                SEED))
+        expected = dilemma.TournamentResults(NUM_PLAYERS, keep_moves=False)
+        for result in dilemma.play_pairs(tournament_jobs()):
+            expected.add_match(*result)
+        self.assertEqual(tournament.result_table, expected.result_table)
+        self.assertEqual(tournament.team_names, expected.team_names)
+        for player in served:
+            self.assertEqual((entrants[player].timeouts,
+                              entrants[player].errors), (0, 0))
+
+@unittest.skipIf(not has_numpy(), 'needs numpy')
+class EvolutionTest(unittest.TestCase):
+    '''Population dynamics.'''
+
+    def test_moran_counts(self):
+        evolution = dilemma.Evolution([0, 1, 2], seed=SEED, repeats=2)
+        for counts in ([1, 0, 0], [0, 0, 0], [2, 2], [3, -1, 1]):
+            self.assertRaises(ValueError, evolution.moran, counts, 10)
+        history = evolution.moran([1, 1, 0], 10, seed=SEED)
+        self.assertEqual(history.shape, (11, 3))
+        self.assertEqual(set(history.sum(axis=1)), set([2]))
+
+if __name__ == '__main__':
+    unittest.main()